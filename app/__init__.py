@@ -2,9 +2,13 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import config
+from app.user_cache import user_cache
+from app.passwords import hash_pool
+from app.instrumentation import instrumentation
+from app.replicas import RoutingSession, replica_router
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # reads can go to replicas
 login_manager = LoginManager()
 login_manager.login_view = 'main.login'
 login_manager.login_message = 'Please log in to access this page.'
@@ -17,14 +21,38 @@ def create_app(config_name='default'):
     
     # Initialize extensions with app
     db.init_app(app)
+    replica_router.init_app(app)
     login_manager.init_app(app)
+    user_cache.init_app(app)
+    hash_pool.init_app(app)
+    instrumentation.init_app(app)
     
     # Register blueprints (routes)
-    from app import routes
+    from app import routes, health, api
     app.register_blueprint(routes.bp)
+    app.register_blueprint(health.bp)
+    app.register_blueprint(api.bp)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Rendered-page cache (imports models, so after db is set up)
+    from app.caching import page_cache
+    page_cache.init_app(app)
+    
+    # Group-commit buffer behind the batch ingestion API
+    from app.ingest import ingest_buffer
+    ingest_buffer.init_app(app)
+    
+    # Thread pool for exports and heavy reports
+    from app.jobs import job_runner
+    job_runner.init_app(app)
+    
+    # Register CLI commands (flask rollup ...)
+    from app import commands
+    commands.init_app(app)
+    
+    # Production workers never run DDL - init_db.py migrates once before they start
+    if app.config.get('SCHEMA_BOOTSTRAP_ON_START'):
+        from app.schema import bootstrap
+        with app.app_context():
+            bootstrap()
     
     return app
\ No newline at end of file
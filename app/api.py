@@ -0,0 +1,52 @@
+import hmac
+from flask import Blueprint, current_app, jsonify, request
+from app.ingest import ingest_buffer, resolve_items
+
+# Machine clients (kiosks, card scanners) - bearer tokens, no session or templates
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+
+def _authorized():
+    """Bearer token from INGEST_API_TOKENS, compared in constant time"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    return any(hmac.compare_digest(token.encode(), allowed.encode())
+               for allowed in current_app.config.get('INGEST_API_TOKENS', []))
+
+
+@bp.route('/attendance/batch', methods=['POST'])
+def attendance_batch():
+    """Record attendance events pushed by kiosks and scanners
+
+    Body: {"items": [{"key", "roll_no", "course_code", "date", "status"}, ...]}
+    (a bare list works too; date defaults to today). Every item gets a
+    result - accepted, duplicate (key already recorded) or rejected with an
+    error - in the order sent. Retrying a whole batch is safe.
+    """
+    if not _authorized():
+        return jsonify({'error': 'invalid or missing API token'}), 401
+
+    payload = request.get_json(silent=True)
+    items = payload.get('items') if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        return jsonify({'error': 'expected a JSON list of items'}), 400
+
+    max_items = current_app.config.get('INGEST_MAX_ITEMS', 1000)
+    if len(items) > max_items:
+        return jsonify({'error': f'at most {max_items} items per request'}), 413
+
+    valid, results = resolve_items(items)
+    try:
+        written = ingest_buffer.submit(valid)
+    except Exception:
+        current_app.logger.exception('Attendance batch flush failed')
+        return jsonify({'error': 'could not save attendance, retry with the same keys'}), 503
+
+    for result in written:
+        results[result['index']] = result
+
+    counts = {'accepted': 0, 'duplicate': 0, 'rejected': 0}
+    for result in results:
+        counts[result['result']] += 1
+    return jsonify({**counts, 'results': results})
@@ -0,0 +1,254 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models import Attendance, AttendanceSummary, CourseDailyStats
+from app.reports import status_counts
+from app.caching import bump_course_versions
+
+VALID_STATUSES = ('present', 'absent', 'late')
+
+# Conflict target - the primary key of Attendance
+CONFLICT_COLUMNS = ['course_id', 'date', 'student_id']
+
+SUMMARY_COLUMNS = ['student_id', 'course_id', 'total', 'present', 'absent', 'late', 'last_session_date']
+
+DAILY_COLUMNS = ['course_id', 'date', 'total', 'present', 'absent', 'late']
+
+
+class AttendanceReadOnly(Exception):
+    """The rows include a date in a term that is archived or being archived"""
+
+
+def _dialect_insert():
+    """Return the dialect-specific insert() that supports ON CONFLICT"""
+    name = db.engine.dialect.name
+    if name == 'postgresql':
+        return postgresql.insert
+    if name == 'sqlite':
+        return sqlite.insert
+    return None
+
+
+def upsert_attendance(rows):
+    """Insert or update attendance rows in as few statements as possible
+
+    Each row is a dict with student_id, course_id, date and status. Existing
+    records for the same (course_id, student_id, date) get their status
+    overwritten, so concurrent submits for the same class never create
+    duplicates. The attendance rollup and the course freshness versions are
+    updated in the same transaction, as are the course's daily stats; the
+    caller owns it (commit/rollback).
+
+    The course_versions rows are bumped first: that locks them (in course
+    id order) until commit, so writers to the same course run one at a time
+    and each rollup recompute sees the previous writer's committed rows.
+    Under that lock, dates in a term whose archival has started raise
+    AttendanceReadOnly - archive_term() takes the same lock to move a course.
+    """
+    if not rows:
+        return 0
+
+    # Coalesce repeats of the same key (last one wins) - a single ON CONFLICT
+    # statement may not touch the same row twice
+    latest = {}
+    for row in rows:
+        latest[(row['course_id'], row['student_id'], row['date'])] = row['status']
+    values = [
+        {
+            'student_id': student_id,
+            'course_id': course_id,
+            'date': attendance_date,
+            'status': status
+        }
+        for (course_id, student_id, attendance_date), status in latest.items()
+    ]
+
+    # Serialize writers per course before anything is recomputed
+    bump_course_versions(row['course_id'] for row in values)
+
+    from app.terms import read_only_through
+    read_only_until = read_only_through()
+    if read_only_until and min(row['date'] for row in values) <= read_only_until:
+        raise AttendanceReadOnly(f'attendance up to {read_only_until} is archived')
+
+    insert = _dialect_insert()
+    if insert is None:
+        _upsert_generic(values)
+        refresh_summaries(values)
+        refresh_daily_stats(values)
+        return len(values)
+
+    # One statement executed for all rows: compiled once and cached, and
+    # sent as multi-row VALUES pages by SQLAlchemy's insertmanyvalues
+    stmt = insert(Attendance.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=CONFLICT_COLUMNS,
+        set_={'status': stmt.excluded.status}
+    )
+    db.session.execute(stmt, values)
+
+    refresh_summaries(values)
+    refresh_daily_stats(values)
+    return len(values)
+
+
+def _upsert_generic(values):
+    """Fallback for databases without ON CONFLICT: delete then insert"""
+    for row in values:
+        Attendance.query.filter_by(
+            student_id=row['student_id'],
+            course_id=row['course_id'],
+            date=row['date']
+        ).delete(synchronize_session=False)
+    db.session.execute(db.insert(Attendance), values)
+
+
+def _summary_select(*conditions):
+    """Grouped counts from Attendance shaped like AttendanceSummary rows"""
+    return db.select(
+        Attendance.student_id,
+        Attendance.course_id,
+        *status_counts(Attendance.status),
+        db.func.max(Attendance.date).label('last_session_date')
+    ).where(*conditions).group_by(Attendance.student_id, Attendance.course_id)
+
+
+def refresh_summaries(rows):
+    """Recompute the rollup for every (student, course) touched by rows
+
+    Counts are recomputed from Attendance rather than incremented, so
+    re-marked days can never make the rollup drift. One INSERT ... SELECT
+    per course. The SELECT reads the statement's snapshot, so the caller
+    must hold the course's course_versions row lock (upsert_attendance bumps
+    it first) or a concurrent writer could overwrite it with stale counts.
+    """
+    students_by_course = {}
+    for row in rows:
+        students_by_course.setdefault(row['course_id'], set()).add(row['student_id'])
+
+    insert = _dialect_insert()
+    for course_id, student_ids in students_by_course.items():
+        select = _summary_select(
+            Attendance.course_id == course_id,
+            Attendance.student_id.in_(student_ids)
+        )
+        if insert is None:
+            AttendanceSummary.query.filter(
+                AttendanceSummary.course_id == course_id,
+                AttendanceSummary.student_id.in_(student_ids)
+            ).delete(synchronize_session=False)
+            db.session.execute(db.insert(AttendanceSummary).from_select(SUMMARY_COLUMNS, select))
+            continue
+
+        stmt = insert(AttendanceSummary).from_select(SUMMARY_COLUMNS, select)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['student_id', 'course_id'],
+            set_={column: stmt.excluded[column] for column in SUMMARY_COLUMNS[2:]}
+        )
+        db.session.execute(stmt)
+
+
+def rebuild_summaries(course_id=None):
+    """Rebuild the rollup from scratch (all courses, or one)"""
+    delete = db.delete(AttendanceSummary)
+    conditions = []
+    if course_id is not None:
+        delete = delete.where(AttendanceSummary.course_id == course_id)
+        conditions.append(Attendance.course_id == course_id)
+    db.session.execute(delete)
+    db.session.execute(
+        db.insert(AttendanceSummary).from_select(SUMMARY_COLUMNS, _summary_select(*conditions))
+    )
+
+
+def verify_summaries():
+    """Return (student_id, course_id, expected, stored) for every drifted rollup row"""
+    expected = {
+        (row.student_id, row.course_id): tuple(row)[2:]
+        for row in db.session.execute(_summary_select())
+    }
+    stored = {
+        (row.student_id, row.course_id): tuple(row)[2:]
+        for row in db.session.execute(
+            db.select(*[getattr(AttendanceSummary, column) for column in SUMMARY_COLUMNS])
+        )
+    }
+
+    drift = []
+    for key in sorted(expected.keys() | stored.keys()):
+        if expected.get(key) != stored.get(key):
+            drift.append((key[0], key[1], expected.get(key), stored.get(key)))
+    return drift
+
+
+def _daily_select(*conditions):
+    """Grouped counts from Attendance shaped like CourseDailyStats rows"""
+    return db.select(
+        Attendance.course_id,
+        Attendance.date,
+        *status_counts(Attendance.status)
+    ).where(*conditions).group_by(Attendance.course_id, Attendance.date)
+
+
+def refresh_daily_stats(rows):
+    """Recompute the daily stats for every (course, date) touched by rows
+
+    Same approach and the same locking requirement as refresh_summaries():
+    recomputed from Attendance, one INSERT ... SELECT per course.
+    """
+    dates_by_course = {}
+    for row in rows:
+        dates_by_course.setdefault(row['course_id'], set()).add(row['date'])
+
+    insert = _dialect_insert()
+    for course_id, dates in dates_by_course.items():
+        select = _daily_select(
+            Attendance.course_id == course_id,
+            Attendance.date.in_(dates)
+        )
+        if insert is None:
+            CourseDailyStats.query.filter(
+                CourseDailyStats.course_id == course_id,
+                CourseDailyStats.date.in_(dates)
+            ).delete(synchronize_session=False)
+            db.session.execute(db.insert(CourseDailyStats).from_select(DAILY_COLUMNS, select))
+            continue
+
+        stmt = insert(CourseDailyStats).from_select(DAILY_COLUMNS, select)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['course_id', 'date'],
+            set_={column: stmt.excluded[column] for column in DAILY_COLUMNS[2:]}
+        )
+        db.session.execute(stmt)
+
+
+def rebuild_daily_stats(course_id=None):
+    """Rebuild the daily stats from scratch (all courses, or one)"""
+    delete = db.delete(CourseDailyStats)
+    conditions = []
+    if course_id is not None:
+        delete = delete.where(CourseDailyStats.course_id == course_id)
+        conditions.append(Attendance.course_id == course_id)
+    db.session.execute(delete)
+    db.session.execute(
+        db.insert(CourseDailyStats).from_select(DAILY_COLUMNS, _daily_select(*conditions))
+    )
+
+
+def verify_daily_stats():
+    """Return (course_id, date, expected, stored) for every drifted daily row"""
+    expected = {
+        (row.course_id, row.date): tuple(row)[2:]
+        for row in db.session.execute(_daily_select())
+    }
+    stored = {
+        (row.course_id, row.date): tuple(row)[2:]
+        for row in db.session.execute(
+            db.select(*[getattr(CourseDailyStats, column) for column in DAILY_COLUMNS])
+        )
+    }
+
+    drift = []
+    for key in sorted(expected.keys() | stored.keys()):
+        if expected.get(key) != stored.get(key):
+            drift.append((key[0], key[1], expected.get(key), stored.get(key)))
+    return drift
@@ -0,0 +1,187 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import wraps
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from app import db
+from app.models import Course, CourseVersion, Enrollment
+
+
+def bump_course_versions(course_ids):
+    """Mark courses as changed; call in the same transaction as the write"""
+    from app.attendance import _dialect_insert
+
+    course_ids = sorted(set(course_ids))
+    if not course_ids:
+        return
+
+    now = datetime.utcnow()
+    insert = _dialect_insert()
+    if insert is None:
+        for course_id in course_ids:
+            updated = db.session.execute(
+                db.update(CourseVersion).where(CourseVersion.course_id == course_id).values(
+                    version=CourseVersion.version + 1, updated_at=now
+                )
+            ).rowcount
+            if not updated:
+                db.session.execute(db.insert(CourseVersion).values(course_id=course_id, version=1, updated_at=now))
+        return
+
+    stmt = insert(CourseVersion.__table__).values(
+        [{'course_id': course_id, 'version': 1, 'updated_at': now} for course_id in course_ids]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['course_id'],
+        set_={'version': CourseVersion.__table__.c.version + 1, 'updated_at': now}
+    )
+    db.session.execute(stmt)
+
+
+def _versions(stmt):
+    """(token, last_modified) for a select of (course_id, version, updated_at)"""
+    rows = db.session.execute(stmt).all()
+    token = ','.join(f'{row[0]}:{row[1] or 0}' for row in rows)
+    last_modified = max((row[2] for row in rows if row[2]), default=None)
+    return token, last_modified
+
+
+def _course_versions_select():
+    return db.select(Course.id, CourseVersion.version, CourseVersion.updated_at).outerjoin(
+        CourseVersion, CourseVersion.course_id == Course.id
+    ).order_by(Course.id)
+
+
+def teacher_freshness(**view_args):
+    """Every course the teacher owns"""
+    return _versions(_course_versions_select().where(Course.teacher_id == current_user.id))
+
+
+def student_freshness(**view_args):
+    """Every course the student is enrolled in"""
+    return _versions(_course_versions_select().join(
+        Enrollment, Enrollment.course_id == Course.id
+    ).where(Enrollment.student_id == current_user.id))
+
+
+def course_freshness(course_id, **view_args):
+    """One course - None if the teacher doesn't own it (the view handles denial)"""
+    token, last_modified = _versions(_course_versions_select().where(
+        Course.id == course_id, Course.teacher_id == current_user.id
+    ))
+    return (token, last_modified) if token else None
+
+
+class PageCache:
+    """LRU cache of rendered HTML bodies, capped by total size in bytes"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get('PAGE_CACHE_MAX_BYTES', self.max_bytes)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, mimetype):
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self.size -= len(old[0])
+            self._entries[key] = (body, mimetype)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+page_cache = PageCache()
+
+
+def cached_page(freshness):
+    """Conditional GET and rendered-page caching for a view
+
+    freshness(**view_args) returns (version_token, last_modified) for the
+    data the page shows. The ETag covers that token plus the user, the query
+    string, today's date and the release, so any attendance or enrollment
+    write produces a new ETag and a new cache key. Only If-None-Match can
+    produce a 304; Last-Modified is sent for information. Requests with
+    pending flash messages always render fresh.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('PAGE_CACHE_ENABLED', True) or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            fresh = freshness(**kwargs)
+            if fresh is None:
+                return view(*args, **kwargs)
+            token, last_modified = fresh
+
+            etag = hashlib.sha1('|'.join([
+                current_app.config.get('RELEASE', ''),
+                request.endpoint,
+                str(current_user.id),
+                current_user.role,
+                request.full_path,
+                date.today().isoformat(),
+                token
+            ]).encode()).hexdigest()
+
+            # ETag only: last_modified doesn't move when the day, the release or a course name changes
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                cached = page_cache.get(etag)
+                if cached:
+                    response = make_response(cached[0])
+                    response.mimetype = cached[1]
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    page_cache.set(etag, response.get_data(), response.mimetype)
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,249 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app import db
+from app.attendance import rebuild_summaries, verify_summaries, rebuild_daily_stats, verify_daily_stats
+from app.importer import import_students, import_enrollments, import_attendance
+from app.ingest import prune_ingest_keys
+from app.jobs import job_runner
+from app.models import Term, SchemaVersion
+from app.replicas import replica_router
+from app.schema import bootstrap, current_version, LATEST_VERSION
+from app.terms import archive_term, TermNotArchivable
+
+# flask rollup ...
+rollup_cli = AppGroup('rollup', help='Maintain the attendance rollup tables.')
+
+
+@rollup_cli.command('rebuild')
+@click.option('--course-id', type=int, default=None, help='Only rebuild this course.')
+def rollup_rebuild(course_id):
+    """Recompute attendance_summary and course_daily_stats from the attendance table"""
+    rebuild_summaries(course_id)
+    rebuild_daily_stats(course_id)
+    db.session.commit()
+    click.echo('✅ Attendance rollups rebuilt')
+
+
+@rollup_cli.command('verify')
+@click.option('--fix', is_flag=True, help='Rebuild the rollups if drift is found.')
+def rollup_verify(fix):
+    """Compare attendance_summary and course_daily_stats with the attendance table"""
+    drift = verify_summaries()
+    daily_drift = verify_daily_stats()
+    if not drift and not daily_drift:
+        click.echo('✅ Attendance rollups are consistent')
+        return
+
+    for student_id, course_id, expected, stored in drift:
+        click.echo(f'Student {student_id} / course {course_id}: expected {expected}, stored {stored}')
+    for course_id, day, expected, stored in daily_drift:
+        click.echo(f'Course {course_id} on {day}: expected {expected}, stored {stored}')
+    click.echo(f'❌ {len(drift)} rollup rows and {len(daily_drift)} daily rows out of date')
+
+    if fix:
+        rebuild_summaries()
+        rebuild_daily_stats()
+        db.session.commit()
+        click.echo('✅ Attendance rollups rebuilt')
+    else:
+        raise SystemExit(1)
+
+
+# flask import ...
+import_cli = AppGroup('import', help='Import students, enrollments and attendance from CSV/XLSX.')
+
+rejects_option = click.option('--rejects', type=click.Path(dir_okay=False),
+                              help='Write rejected rows (with reasons) to this CSV file.')
+
+
+def _print_report(report, rejects):
+    click.echo(f'✅ Imported {report.imported} rows')
+    if report.rejected:
+        click.echo(f'⚠️  Rejected {report.rejected} rows')
+        for line, row, reason in report.rejects[:10]:
+            click.echo(f'  line {line}: {reason}')
+        if rejects:
+            report.write_rejects(rejects)
+            click.echo(f'  Details written to {rejects}')
+
+
+@import_cli.command('students')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--default-password', default='password123', show_default=True,
+              help='Password for rows without a password column.')
+@rejects_option
+def import_students_command(path, default_password, rejects):
+    """Columns: username, email, roll_no[, password]"""
+    _print_report(import_students(path, default_password), rejects)
+
+
+@import_cli.command('enrollments')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@rejects_option
+def import_enrollments_command(path, rejects):
+    """Columns: roll_no, course_code"""
+    _print_report(import_enrollments(path), rejects)
+
+
+@import_cli.command('attendance')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@rejects_option
+def import_attendance_command(path, rejects):
+    """Columns: roll_no, course_code, date (YYYY-MM-DD), status"""
+    _print_report(import_attendance(path), rejects)
+
+
+# flask schema ...
+schema_cli = AppGroup('schema', help='Versioned schema migrations.')
+
+
+@schema_cli.command('upgrade')
+def schema_upgrade():
+    """Apply pending migrations (no-op when current)"""
+    applied = bootstrap()
+    for version, description in applied:
+        click.echo(f'✅ Schema v{version}: {description}')
+    if not applied:
+        click.echo(f'ℹ️  Schema is current (v{LATEST_VERSION})')
+
+
+@schema_cli.command('version')
+def schema_version():
+    """Show the applied and latest schema version"""
+    click.echo(f'Applied: v{current_version()}  Latest: v{LATEST_VERSION}')
+
+
+# flask ingest ...
+ingest_cli = AppGroup('ingest', help='Batch ingestion API housekeeping.')
+
+
+@ingest_cli.command('prune')
+@click.option('--days', type=int, default=None,
+              help='Keep keys this many days (default INGEST_KEY_RETENTION_DAYS).')
+def ingest_prune(days):
+    """Delete old idempotency keys - retries older than this are no longer deduplicated"""
+    days = days if days is not None else current_app.config['INGEST_KEY_RETENTION_DAYS']
+    removed = prune_ingest_keys(days)
+    db.session.commit()
+    click.echo(f'✅ Removed {removed} idempotency keys older than {days} days')
+
+
+# flask jobs ...
+jobs_cli = AppGroup('jobs', help='Background job housekeeping.')
+
+
+@jobs_cli.command('prune')
+@click.option('--hours', type=int, default=None,
+              help='Keep finished jobs this many hours (default JOB_RESULT_TTL_HOURS).')
+def jobs_prune(hours):
+    """Fail jobs whose worker went away and delete old results"""
+    hours = hours if hours is not None else current_app.config['JOB_RESULT_TTL_HOURS']
+    lost, removed = job_runner.prune(hours)
+    click.echo(f'✅ Removed {removed} finished jobs, marked {lost} lost jobs failed')
+
+
+# flask terms ...
+terms_cli = AppGroup('terms', help='Academic terms and attendance archival.')
+
+
+@terms_cli.command('add')
+@click.argument('name')
+@click.argument('start', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.argument('end', type=click.DateTime(formats=['%Y-%m-%d']))
+def terms_add(name, start, end):
+    """Define a term: NAME START END (dates YYYY-MM-DD, inclusive)"""
+    start, end = start.date(), end.date()
+    if end < start:
+        raise click.BadParameter('END is before START')
+    overlapping = db.session.scalar(db.select(Term.name).where(
+        Term.start_date <= end, Term.end_date >= start
+    ).limit(1))
+    if overlapping:
+        raise click.ClickException(f'overlaps {overlapping}')
+    db.session.add(Term(name=name, start_date=start, end_date=end))
+    db.session.commit()
+    click.echo(f'✅ Term {name}: {start} to {end}')
+
+
+@terms_cli.command('list')
+def terms_list():
+    """Show every term and whether it is archived"""
+    for term in db.session.scalars(db.select(Term).order_by(Term.start_date)):
+        if term.archived_at:
+            state = f"archived {term.archived_at.strftime('%Y-%m-%d')}"
+        else:
+            state = 'archiving (interrupted? run archive again)' if term.archive_started_at else 'current'
+        click.echo(f'{term.name:<20} {term.start_date} to {term.end_date}  {state}')
+
+
+@terms_cli.command('archive')
+@click.argument('name')
+def terms_archive(name):
+    """Move a closed term's attendance into attendance_archive"""
+    term = db.session.scalar(db.select(Term).where(Term.name == name))
+    if term is None:
+        raise click.ClickException(f'no term named {name}')
+    try:
+        moved = archive_term(term)
+    except TermNotArchivable as e:
+        raise click.ClickException(str(e))
+    click.echo(f'✅ Archived {term.name}: {moved} attendance rows moved')
+
+
+# flask replicas ...
+replicas_cli = AppGroup('replicas', help='Read replicas (DATABASE_REPLICA_URLS).')
+
+
+def _schema_version(engine):
+    with engine.connect() as connection:
+        return connection.scalar(db.select(db.func.max(SchemaVersion.version)))
+
+
+@replicas_cli.command('status')
+def replicas_status():
+    """Show each replica's schema version next to the primary's"""
+    if not replica_router.bind_keys:
+        click.echo('ℹ️  No replicas configured - every query runs on the primary')
+        return
+    primary = _schema_version(db.engine)
+    click.echo(f'primary      v{primary}')
+    for key, engine in replica_router.engines().items():
+        try:
+            version = _schema_version(engine)
+        except Exception as e:
+            click.echo(f'{key:<12} ❌ {e}')
+            continue
+        click.echo(f"{key:<12} v{version}{'' if version == primary else '  ⚠️  behind the primary'}")
+
+
+@replicas_cli.command('sync')
+def replicas_sync():
+    """Copy a SQLite primary onto SQLite replicas (local testing without real replication)"""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('only for SQLite - PostgreSQL replicas follow the primary by streaming replication')
+    source = db.engine.raw_connection()
+    try:
+        for key, engine in replica_router.engines().items():
+            if engine.dialect.name != 'sqlite':
+                click.echo(f'{key}: skipped (not SQLite)')
+                continue
+            target = engine.raw_connection()
+            try:
+                source.driver_connection.backup(target.driver_connection)
+            finally:
+                target.close()
+            click.echo(f'✅ {key} now matches the primary')
+    finally:
+        source.close()
+
+
+def init_app(app):
+    """Register CLI command groups"""
+    app.cli.add_command(rollup_cli)
+    app.cli.add_command(import_cli)
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(ingest_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(terms_cli)
+    app.cli.add_command(replicas_cli)
@@ -0,0 +1,68 @@
+from datetime import datetime
+from app import db
+from app.models import User, Enrollment
+from app.caching import bump_course_versions
+
+
+def _insert_students(course_id, condition):
+    """INSERT ... SELECT every student matching condition who isn't enrolled yet"""
+    already_enrolled = db.select(Enrollment.id).where(
+        Enrollment.student_id == User.id,
+        Enrollment.course_id == course_id
+    ).exists()
+    select = db.select(
+        User.id,
+        db.literal(course_id),
+        db.literal(datetime.utcnow()),
+        db.literal('active')
+    ).where(
+        User.role == 'student',
+        condition,
+        ~already_enrolled
+    )
+    result = db.session.execute(
+        db.insert(Enrollment).from_select(
+            ['student_id', 'course_id', 'enrolled_date', 'status'], select
+        )
+    )
+    return result.rowcount
+
+
+def sync_enrollments(course_id, student_ids):
+    """Make a course's roster match student_ids by applying only the difference
+
+    Students who stay enrolled keep their row (and enrolled_date). Removals
+    are one DELETE, additions one INSERT ... SELECT that also ignores ids
+    which aren't students. Returns (added, removed).
+    """
+    requested = {int(student_id) for student_id in student_ids}
+    current = set(db.session.scalars(
+        db.select(Enrollment.student_id).where(Enrollment.course_id == course_id)
+    ))
+
+    removed = 0
+    to_remove = current - requested
+    if to_remove:
+        removed = db.session.execute(
+            db.delete(Enrollment).where(
+                Enrollment.course_id == course_id,
+                Enrollment.student_id.in_(to_remove)
+            )
+        ).rowcount
+
+    added = 0
+    to_add = requested - current
+    if to_add:
+        added = _insert_students(course_id, User.id.in_(to_add))
+
+    if added or removed:
+        bump_course_versions([course_id])
+    return added, removed
+
+
+def enroll_all_students(course_id):
+    """Enroll every student not already in the course with one INSERT ... SELECT"""
+    added = _insert_students(course_id, db.true())
+    if added:
+        bump_course_versions([course_id])
+    return added
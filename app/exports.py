@@ -0,0 +1,199 @@
+import os
+import tempfile
+from datetime import datetime
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from app import db
+from app.models import User, Course, Attendance, AttendanceArchive
+from app.reports import attendance_counts_by_course, course_predictions, percentage, STREAM_BATCH_SIZE
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Bytes per chunk when streaming the finished file to the client
+CHUNK_SIZE = 64 * 1024
+
+SUMMARY_HEADERS = ['Course', 'Roll No', 'Student Name', 'Email', 'Total Classes',
+                   'Present', 'Absent', 'Late', 'Attendance %', 'Status']
+RECORD_HEADERS = ['Date', 'Course', 'Roll No', 'Student Name', 'Status']
+ALERT_HEADERS = ['Course', 'Roll No', 'Student Name', 'Email', 'Total Classes', 'Present',
+                 'Current %', 'After 3 Absences %', 'Absences Remaining', 'Alert']
+
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+HEADER_FILL = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+GOOD_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+LOW_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+WARN_FILL = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
+RISK_HEADERS = ['Rank', 'Course', 'Roll No', 'Student Name', 'Email', 'Total Classes', 'Present', 'Late',
+                'Current %', 'After 3 Absences %', 'Absences Remaining', 'Recent Trend (pts)',
+                'Current Absence Streak', 'Longest Absence Streak', 'Alert']
+ALERT_FILLS = {'critical': LOW_FILL, 'warning': WARN_FILL, 'safe': GOOD_FILL}
+
+
+def attendance_records(course_ids, start_date=None, end_date=None, archived=False):
+    """Stream raw attendance as plain tuples (date, course_code, roll_no, username, status)"""
+    source = AttendanceArchive if archived else Attendance
+    stmt = db.select(
+        source.date,
+        Course.code,
+        User.roll_no,
+        User.username,
+        source.status
+    ).join(
+        Course, Course.id == source.course_id
+    ).join(
+        User, User.id == source.student_id
+    ).where(
+        source.course_id.in_(course_ids)
+    )
+    if start_date:
+        stmt = stmt.where(source.date >= start_date)
+    if end_date:
+        stmt = stmt.where(source.date <= end_date)
+    stmt = stmt.order_by(Course.code, source.date, User.roll_no)
+
+    for row in db.session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE)):
+        yield tuple(row)
+
+
+def _header_row(ws, headers):
+    """Styled header cells - the only per-cell styling in the sheet"""
+    row = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        cell.alignment = Alignment(horizontal='center')
+        row.append(cell)
+    return row
+
+
+def write_attendance_workbook(path, courses, start_date=None, end_date=None, archived=False):
+    """Write a summary sheet and a records sheet to path using a write-only workbook
+
+    Rows go from the database cursor straight to disk, so memory stays flat
+    regardless of how many students, courses or days are exported. With
+    archived, rows come from attendance_archive instead.
+    """
+    course_ids = [course.id for course in courses]
+    wb = Workbook(write_only=True)
+
+    # Summary sheet - one row per student per course
+    ws = wb.create_sheet("Attendance Report")
+    for col in range(len(SUMMARY_HEADERS)):
+        ws.column_dimensions[chr(65 + col)].width = 15
+
+    title = WriteOnlyCell(ws, value=f"Attendance Report - {', '.join(course.name for course in courses)}")
+    title.font = Font(size=16, bold=True)
+    ws.append([title])
+    ws.append([f"Course Code: {', '.join(course.code for course in courses)}"])
+    ws.append([f"Period: {start_date or 'start'} to {end_date or 'today'}"])
+    ws.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+    ws.append(_header_row(ws, SUMMARY_HEADERS))
+
+    for code, roll_no, username, email, total, present, absent, late in attendance_counts_by_course(
+            course_ids, start_date, end_date, archived):
+        pct = percentage(present, total)
+        status = WriteOnlyCell(ws, value='Good' if pct >= 75 else 'Low')
+        status.fill = GOOD_FILL if pct >= 75 else LOW_FILL
+        ws.append([code, roll_no or 'N/A', username, email, total,
+                   present, absent, late, f"{pct}%", status])
+
+    # Records sheet - every marked class in the period
+    ws = wb.create_sheet("Records")
+    for col in range(len(RECORD_HEADERS)):
+        ws.column_dimensions[chr(65 + col)].width = 15
+    ws.append(_header_row(ws, RECORD_HEADERS))
+    for attendance_date, code, roll_no, username, status in attendance_records(
+            course_ids, start_date, end_date, archived):
+        ws.append([attendance_date, code, roll_no or 'N/A', username, status])
+
+    wb.save(path)
+
+
+def write_alerts_workbook(path, courses):
+    """Predictive alerts for several courses in one sheet, most urgent first per course"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Predictive Alerts")
+    for col in range(len(ALERT_HEADERS)):
+        ws.column_dimensions[chr(65 + col)].width = 15
+
+    title = WriteOnlyCell(ws, value="Predictive Attendance Alerts")
+    title.font = Font(size=16, bold=True)
+    ws.append([title])
+    ws.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+    ws.append(_header_row(ws, ALERT_HEADERS))
+
+    for course in courses:
+        for prediction in course_predictions(course.id):
+            student = prediction['student']
+            alert = WriteOnlyCell(ws, value=prediction['alert_level'].title())
+            if prediction['alert_level'] in ALERT_FILLS:
+                alert.fill = ALERT_FILLS[prediction['alert_level']]
+            ws.append([course.code, student.roll_no or 'N/A', student.username, student.email,
+                       prediction['total_classes'], prediction['present'],
+                       prediction['current_percentage'], prediction['predicted_percentage'],
+                       prediction['absences_remaining'], alert])
+
+    wb.save(path)
+
+
+def write_risk_workbook(path, report):
+    """Every ranked row of a RiskReport (app/risk.py) in one sheet"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("At-Risk Students")
+    for col in range(len(RISK_HEADERS)):
+        ws.column_dimensions[chr(65 + col)].width = 15
+
+    title = WriteOnlyCell(ws, value="At-Risk Students - All Courses")
+    title.font = Font(size=16, bold=True)
+    ws.append([title])
+    ws.append([', '.join(f"{level.title()}: {count}" for level, count in report.counts().items())])
+    ws.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+    ws.append(_header_row(ws, RISK_HEADERS))
+
+    for rank, row in enumerate(report.rows(), start=1):
+        student, course = row['student'], row['course']
+        alert = WriteOnlyCell(ws, value=row['alert_level'].title())
+        if row['alert_level'] in ALERT_FILLS:
+            alert.fill = ALERT_FILLS[row['alert_level']]
+        ws.append([rank, course.code, student.roll_no or 'N/A', student.username, student.email,
+                   row['total'], row['present'], row['late'], row['current_percentage'],
+                   row['predicted_percentage'], row['absences_remaining'], row['trend'],
+                   row['current_streak'], row['longest_streak'], alert])
+
+    wb.save(path)
+
+
+def stream_file(path, chunk_size=CHUNK_SIZE):
+    """Yield a file in chunks
+
+    The caller deletes the file, from response.call_on_close(): a generator's
+    cleanup only runs if the server starts iterating it.
+    """
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def remove_file(path):
+    """Delete a temporary file if it is still there"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def export_to_tempfile(courses, start_date=None, end_date=None):
+    """Build the workbook in a temporary file and return its path"""
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        write_attendance_workbook(path, courses, start_date, end_date)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
@@ -0,0 +1,66 @@
+import logging
+from flask import Blueprint, jsonify
+from sqlalchemy.pool import QueuePool
+from app import db
+from app.replicas import replica_router
+
+logger = logging.getLogger('app.health')
+
+# Load balancer / platform probes - no login, no templates
+bp = Blueprint('health', __name__, url_prefix='/health')
+
+
+def pool_status(engine):
+    """Checked-out/idle/overflow counts for a QueuePool (None for other pool types)"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return None
+    return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'max_overflow': pool._max_overflow
+    }
+
+
+def replica_status(engine):
+    """'ok' or 'unavailable' from a trivial query on a replica (the error is logged)"""
+    try:
+        with engine.connect() as connection:
+            connection.execute(db.text('SELECT 1'))
+    except Exception:
+        logger.exception('Replica %s failed its readiness query', engine.url.host)
+        return 'unavailable'
+    return 'ok'
+
+
+@bp.route('/live')
+def live():
+    """The process is up"""
+    return jsonify({'status': 'ok'})
+
+
+@bp.route('/ready')
+def ready():
+    """Ready for traffic: the database answers and the pool isn't exhausted"""
+    result = {'status': 'ok', 'database': 'ok', 'pool': pool_status(db.engine)}
+    try:
+        db.session.execute(db.text('SELECT 1'))
+    except Exception:
+        # Probes are unauthenticated: connection errors can name hosts and users
+        logger.exception('Database failed its readiness query')
+        db.session.rollback()
+        result.update(status='unavailable', database='unavailable')
+        return jsonify(result), 503
+
+    pool = result['pool']
+    if pool and pool['checked_out'] >= pool['size'] + pool['max_overflow']:
+        result['status'] = 'saturated'
+        return jsonify(result), 503
+
+    # Reported, not fatal: the primary can serve every request on its own
+    if replica_router.bind_keys:
+        result['replicas'] = {key: replica_status(engine) for key, engine in replica_router.engines().items()}
+
+    return jsonify(result)
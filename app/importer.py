@@ -0,0 +1,227 @@
+import csv
+import os
+from datetime import date, datetime
+from itertools import islice
+from openpyxl import load_workbook
+from app import db
+from app.models import User, Course, Enrollment
+from app.attendance import upsert_attendance, VALID_STATUSES
+from app.passwords import hash_password
+from app.caching import bump_course_versions
+from app.terms import read_only_through
+
+# Rows validated and written per transaction
+IMPORT_BATCH_SIZE = 5000
+
+# Rejected rows kept in memory for the report; the rest are only counted
+MAX_REPORTED_REJECTS = 1000
+
+
+class ImportReport:
+    """Outcome of an import: rows written and rows rejected (with reasons)"""
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.rejects = []
+
+    def reject(self, line, row, reason):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append((line, row, reason))
+
+    def write_rejects(self, path):
+        """Save the reported rejects as CSV (line, reason, original columns)"""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['line', 'reason', 'row'])
+            for line, row, reason in self.rejects:
+                writer.writerow([line, reason, row])
+
+
+def read_rows(path):
+    """Yield (line_number, row_dict) from a CSV or XLSX file with a header row
+
+    Header names are lower-cased and stripped; nothing is loaded up front.
+    """
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm'):
+        wb = load_workbook(path, read_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            headers = [str(h or '').strip().lower() for h in next(rows, [])]
+            for line, values in enumerate(rows, start=2):
+                if any(value is not None for value in values):
+                    yield line, dict(zip(headers, values))
+        finally:
+            wb.close()
+        return
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        headers = [h.strip().lower() for h in next(reader, [])]
+        for line, values in enumerate(reader, start=2):
+            if any(values):
+                yield line, dict(zip(headers, values))
+
+
+def batched(rows, size=IMPORT_BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _text(row, key):
+    value = row.get(key)
+    return str(value).strip() if value is not None else ''
+
+
+def _parse_date(value):
+    if hasattr(value, 'date'):  # XLSX cells come back as datetime
+        return value.date()
+    return date.fromisoformat(str(value).strip())
+
+
+def _roll_no_map():
+    """roll_no -> user id for every student, built once per import"""
+    return dict(db.session.execute(
+        db.select(User.roll_no, User.id).where(User.role == 'student', User.roll_no.isnot(None))
+    ).all())
+
+
+def _course_map():
+    return dict(db.session.execute(db.select(Course.code, Course.id)).all())
+
+
+def import_students(path, default_password):
+    """Create student accounts from username, email, roll_no[, password] columns
+
+    Rows without their own password share one pre-computed hash of
+    default_password, so hashing cost doesn't scale with the file.
+    """
+    report = ImportReport()
+    default_hash = hash_password(default_password)
+    seen_usernames = set(db.session.scalars(db.select(User.username)))
+    seen_emails = set(db.session.scalars(db.select(User.email)))
+    seen_roll_nos = set(db.session.scalars(db.select(User.roll_no).where(User.roll_no.isnot(None))))
+
+    for batch in batched(read_rows(path)):
+        values = []
+        for line, row in batch:
+            username, email, roll_no = _text(row, 'username'), _text(row, 'email'), _text(row, 'roll_no')
+            if not username or not email:
+                report.reject(line, row, 'username and email are required')
+            elif username in seen_usernames:
+                report.reject(line, row, f'username {username} already exists')
+            elif email in seen_emails:
+                report.reject(line, row, f'email {email} already exists')
+            elif roll_no and roll_no in seen_roll_nos:
+                report.reject(line, row, f'roll_no {roll_no} already exists')
+            else:
+                password = _text(row, 'password')
+                seen_usernames.add(username)
+                seen_emails.add(email)
+                if roll_no:
+                    seen_roll_nos.add(roll_no)
+                values.append({
+                    'username': username,
+                    'email': email,
+                    'roll_no': roll_no or None,
+                    'role': 'student',
+                    'password_hash': hash_password(password) if password else default_hash
+                })
+
+        if values:
+            db.session.execute(db.insert(User), values)
+            db.session.commit()
+            report.imported += len(values)
+
+    return report
+
+
+def import_enrollments(path):
+    """Enroll students from roll_no, course_code columns; existing pairs are skipped"""
+    report = ImportReport()
+    students = _roll_no_map()
+    courses = _course_map()
+    enrolled = set(db.session.execute(db.select(Enrollment.student_id, Enrollment.course_id)).all())
+
+    for batch in batched(read_rows(path)):
+        values = []
+        now = datetime.utcnow()
+        for line, row in batch:
+            student_id = students.get(_text(row, 'roll_no'))
+            course_id = courses.get(_text(row, 'course_code'))
+            if student_id is None:
+                report.reject(line, row, 'unknown roll_no')
+            elif course_id is None:
+                report.reject(line, row, 'unknown course_code')
+            elif (student_id, course_id) in enrolled:
+                report.reject(line, row, 'already enrolled')
+            else:
+                enrolled.add((student_id, course_id))
+                values.append({
+                    'student_id': student_id,
+                    'course_id': course_id,
+                    'enrolled_date': now,
+                    'status': 'active'
+                })
+
+        if values:
+            db.session.execute(db.insert(Enrollment), values)
+            bump_course_versions(value['course_id'] for value in values)
+            db.session.commit()
+            report.imported += len(values)
+
+    return report
+
+
+def import_attendance(path):
+    """Load historical attendance from roll_no, course_code, date, status columns
+
+    Rows are upserted, so re-importing a file (or overlapping what teachers
+    already marked) updates rather than duplicates. The rollup is kept in step.
+    """
+    report = ImportReport()
+    students = _roll_no_map()
+    courses = _course_map()
+    archived_until = read_only_through()
+
+    for batch in batched(read_rows(path)):
+        values = []
+        for line, row in batch:
+            student_id = students.get(_text(row, 'roll_no'))
+            course_id = courses.get(_text(row, 'course_code'))
+            status = _text(row, 'status').lower()
+            if student_id is None:
+                report.reject(line, row, 'unknown roll_no')
+                continue
+            if course_id is None:
+                report.reject(line, row, 'unknown course_code')
+                continue
+            if status not in VALID_STATUSES:
+                report.reject(line, row, f'invalid status {status!r}')
+                continue
+            try:
+                attendance_date = _parse_date(row.get('date'))
+            except (TypeError, ValueError):
+                report.reject(line, row, 'date must be YYYY-MM-DD')
+                continue
+            if archived_until and attendance_date <= archived_until:
+                report.reject(line, row, 'date is in an archived term')
+                continue
+            values.append({
+                'student_id': student_id,
+                'course_id': course_id,
+                'date': attendance_date,
+                'status': status
+            })
+
+        if values:
+            upsert_attendance(values)
+            db.session.commit()
+            report.imported += len(values)
+
+    return report
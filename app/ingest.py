@@ -0,0 +1,264 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import User, Course, Enrollment, IngestKey
+from app.attendance import upsert_attendance, VALID_STATUSES
+from app.terms import read_only_through
+
+# Keys per IN (...) lookup
+KEY_LOOKUP_CHUNK = 500
+
+MAX_KEY_LENGTH = 100
+
+
+def _chunks(values, size=KEY_LOOKUP_CHUNK):
+    values = iter(values)
+    while True:
+        chunk = list(islice(values, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _text(item, key):
+    value = item.get(key)
+    return str(value).strip() if value is not None else ''
+
+
+def resolve_items(raw_items):
+    """Validate raw API items and map roll_no/course_code to ids
+
+    Four queries per request regardless of size. Returns (items, results):
+    items are the valid ones, ready for IngestBuffer.submit(); results has
+    one dict per raw item, already filled in for rejected items and None
+    for the rest.
+    """
+    roll_nos = {_text(item, 'roll_no') for item in raw_items if isinstance(item, dict)}
+    codes = {_text(item, 'course_code') for item in raw_items if isinstance(item, dict)}
+    students = dict(db.session.execute(
+        db.select(User.roll_no, User.id).where(User.role == 'student', User.roll_no.in_(roll_nos))
+    ).all()) if roll_nos else {}
+    courses = dict(db.session.execute(
+        db.select(Course.code, Course.id).where(Course.code.in_(codes))
+    ).all()) if codes else {}
+    enrolled = set(db.session.execute(
+        db.select(Enrollment.course_id, Enrollment.student_id).where(
+            Enrollment.course_id.in_(courses.values()),
+            Enrollment.student_id.in_(students.values())
+        )
+    ).all()) if students and courses else set()
+    archived_until = read_only_through()
+
+    today = date.today()
+    items, results = [], []
+    for index, item in enumerate(raw_items):
+        if not isinstance(item, dict):
+            results.append({'index': index, 'key': None, 'result': 'rejected', 'error': 'item must be an object'})
+            continue
+
+        key = _text(item, 'key')
+        status = _text(item, 'status').lower()
+        student_id = students.get(_text(item, 'roll_no'))
+        course_id = courses.get(_text(item, 'course_code'))
+        error = None
+        try:
+            attendance_date = date.fromisoformat(_text(item, 'date')) if item.get('date') else today
+        except ValueError:
+            error = 'date must be YYYY-MM-DD'
+
+        if not key or len(key) > MAX_KEY_LENGTH:
+            error = f'key is required (at most {MAX_KEY_LENGTH} characters)'
+        elif student_id is None:
+            error = 'unknown roll_no'
+        elif course_id is None:
+            error = 'unknown course_code'
+        elif status not in VALID_STATUSES:
+            error = f'invalid status {status!r}'
+        elif (course_id, student_id) not in enrolled:
+            error = 'student is not enrolled in this course'
+        elif error is None and attendance_date > today:
+            error = 'date is in the future'
+        elif error is None and archived_until and attendance_date <= archived_until:
+            error = 'date is in an archived term'
+
+        if error:
+            results.append({'index': index, 'key': key or None, 'result': 'rejected', 'error': error})
+            continue
+
+        results.append(None)
+        items.append({
+            'index': index,
+            'key': key,
+            'student_id': student_id,
+            'course_id': course_id,
+            'date': attendance_date,
+            'status': status
+        })
+    return items, results
+
+
+def write_items(items):
+    """Record new idempotency keys and upsert their attendance; one result per item
+
+    A key seen before (in the table or earlier in items) is a duplicate and
+    writes nothing; reusing a key for different data is rejected. The
+    caller commits.
+    """
+    existing = {}
+    for chunk in _chunks({item['key'] for item in items}):
+        for row in db.session.scalars(db.select(IngestKey).where(IngestKey.key.in_(chunk))):
+            existing[row.key] = (row.student_id, row.course_id, row.date, row.status)
+
+    now = datetime.utcnow()
+    results, rows, keys = [], [], []
+    for item in items:
+        payload = (item['student_id'], item['course_id'], item['date'], item['status'])
+        result = {'index': item['index'], 'key': item['key']}
+        seen = existing.get(item['key'])
+        if seen is None:
+            existing[item['key']] = payload
+            rows.append(item)
+            keys.append({'key': item['key'], 'student_id': payload[0], 'course_id': payload[1],
+                         'date': payload[2], 'status': payload[3], 'received_at': now})
+            result['result'] = 'accepted'
+        elif seen == payload:
+            result['result'] = 'duplicate'
+        else:
+            result.update(result='rejected', error='key was already used for different attendance')
+        results.append(result)
+
+    if keys:
+        db.session.execute(db.insert(IngestKey), keys)
+        upsert_attendance(rows)
+    return results
+
+
+class _Ticket:
+    """One request's items waiting in the buffer"""
+
+    def __init__(self, items):
+        self.items = items
+        self.results = None
+        self.error = None
+        self.done = False
+
+
+class IngestBuffer:
+    """Group commit for the batch ingestion API
+
+    Requests add their items and wait. Whichever waiting request first sees
+    INGEST_FLUSH_SIZE rows buffered, or its own INGEST_FLUSH_MS deadline
+    pass, takes everything pending and writes it in one transaction (one
+    key lookup, one upsert); the others wake up with their results. Bursts
+    from many scanners become a handful of transactions instead of one per
+    swipe, and nothing is acknowledged before it is committed.
+    """
+
+    def __init__(self, flush_size=500, flush_ms=200):
+        self.flush_size = flush_size
+        self.flush_ms = flush_ms
+        self._pending = []
+        self._pending_rows = 0
+        self._flushing = False
+        self._cond = threading.Condition()
+        self.flushes = 0
+        self.rows = 0
+        self.failures = 0
+
+    def init_app(self, app):
+        self.flush_size = app.config.get('INGEST_FLUSH_SIZE', self.flush_size)
+        self.flush_ms = app.config.get('INGEST_FLUSH_MS', self.flush_ms)
+
+    def submit(self, items):
+        """Buffer items until they are committed; returns their results in order
+
+        Raises the flush's exception if the write failed - nothing from that
+        flush was saved, so clients can retry with the same keys.
+        """
+        if not items:
+            return []
+
+        ticket = _Ticket(items)
+        deadline = time.monotonic() + self.flush_ms / 1000
+        batch = None
+        with self._cond:
+            self._pending.append(ticket)
+            self._pending_rows += len(items)
+            if self._pending_rows >= self.flush_size:
+                self._cond.notify_all()
+
+            while not ticket.done:
+                remaining = deadline - time.monotonic()
+                if not self._flushing and (self._pending_rows >= self.flush_size or remaining <= 0):
+                    batch = self._pending
+                    self._pending = []
+                    self._pending_rows = 0
+                    self._flushing = True
+                    break
+                self._cond.wait(None if self._flushing else remaining)
+
+        if batch is not None:
+            try:
+                self._flush(batch)
+            finally:
+                with self._cond:
+                    self._flushing = False
+                    self._cond.notify_all()
+
+        if ticket.error is not None:
+            raise ticket.error
+        return ticket.results
+
+    def _flush(self, batch):
+        items = [item for ticket in batch for item in ticket.items]
+        error = None
+        for attempt in range(2):
+            try:
+                results = write_items(items)
+                db.session.commit()
+                error = None
+                break
+            except IntegrityError as e:
+                # Another worker stored one of these keys first - the retry sees it
+                db.session.rollback()
+                error = e
+            except Exception as e:
+                db.session.rollback()
+                error = e
+                break
+
+        with self._cond:
+            if error is None:
+                self.flushes += 1
+                self.rows += len(items)
+            else:
+                self.failures += 1
+            offset = 0
+            for ticket in batch:
+                if error is None:
+                    ticket.results = results[offset:offset + len(ticket.items)]
+                    offset += len(ticket.items)
+                else:
+                    ticket.error = error
+                ticket.done = True
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': self._pending_rows,
+                'flushes': self.flushes,
+                'rows': self.rows,
+                'failures': self.failures
+            }
+
+
+ingest_buffer = IngestBuffer()
+
+
+def prune_ingest_keys(days):
+    """Forget idempotency keys older than days; returns how many were removed"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    return db.session.execute(db.delete(IngestKey).where(IngestKey.received_at < cutoff)).rowcount
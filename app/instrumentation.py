@@ -0,0 +1,262 @@
+import hmac
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, has_app_context, request, Response, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('app.slow_requests')
+budget_logger = logging.getLogger('app.query_budget')
+
+# Request latency histogram buckets (milliseconds)
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Characters of SQL kept when reporting repeated statements
+STATEMENT_PREFIX = 160
+
+
+class QueryBudgetExceeded(Exception):
+    """A view issued more SQL statements than its declared query_budget"""
+
+
+def query_budget(statements):
+    """Declare the most SQL statements a view may issue in one request
+
+    Checked after every request when QUERY_BUDGET_MODE is 'warn' (log) or
+    'raise' (fail the request - for development, tests and benchmarks).
+    The count covers everything in the request, user loading included.
+    """
+    def decorator(view):
+        view._query_budget = statements
+        return view
+    return decorator
+
+
+class RouteMetrics:
+    """Latency histogram and SQL totals for one endpoint (per process)"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.db_ms = 0.0
+        self.statements = 0
+
+    def observe(self, total_ms, db_ms, statements):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if total_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.count += 1
+        self.total_ms += total_ms
+        self.db_ms += db_ms
+        self.statements += statements
+
+
+class Instrumentation:
+    """Per-request SQL count, DB time and template time
+
+    Engine events feed counters kept on flask.g; after_request turns them
+    into a Server-Timing header, a structured log line for slow requests and
+    per-route histograms served from /metrics, and checks each view's
+    query_budget. Timing is off unless INSTRUMENTATION_ENABLED is set and
+    budgets unless QUERY_BUDGET_MODE is.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self._lock = threading.Lock()
+        self._engine_hooked = False
+        self.enabled = False
+        self.budget_mode = 'off'
+        self.metrics_token = None
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('INSTRUMENTATION_ENABLED'))
+        self.budget_mode = app.config.get('QUERY_BUDGET_MODE', 'off')
+        if not self.enabled and self.budget_mode == 'off':
+            return
+
+        self.server_timing = app.config.get('SERVER_TIMING_ENABLED', True)
+        self.slow_request_ms = app.config.get('SLOW_REQUEST_MS', 500)
+
+        if not self._engine_hooked:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _cursor_error)
+            self._engine_hooked = True
+
+        app.before_request(_start_request)
+        app.after_request(self._finish_request)
+        if not self.enabled:
+            return
+
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+
+        # Per-route timings and cache sizes aren't for the public: only served with a token
+        self.metrics_token = app.config.get('METRICS_TOKEN')
+        if app.config.get('METRICS_ENABLED', True) and self.metrics_token:
+            app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def _finish_request(self, response):
+        stats = g.get('_instrumentation')
+        if stats is None:
+            return response
+
+        if self.budget_mode != 'off':
+            self._check_budget(stats, response)
+        if not self.enabled:
+            return response
+
+        total_ms = (time.perf_counter() - stats['started']) * 1000
+        endpoint = request.endpoint or 'unmatched'
+
+        with self._lock:
+            self.routes.setdefault(endpoint, RouteMetrics()).observe(
+                total_ms, stats['db_ms'], stats['statements']
+            )
+
+        if self.server_timing:
+            response.headers['Server-Timing'] = ', '.join([
+                f'db;dur={stats["db_ms"]:.1f};desc="{stats["statements"]} queries"',
+                f'tpl;dur={stats["template_ms"]:.1f}',
+                f'app;dur={total_ms:.1f}'
+            ])
+
+        if total_ms >= self.slow_request_ms:
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 1),
+                'db_ms': round(stats['db_ms'], 1),
+                'template_ms': round(stats['template_ms'], 1),
+                'statements': stats['statements'],
+                'top_statements': [
+                    {'count': count, 'sql': sql}
+                    for sql, count in stats['sql'].most_common(3)
+                ]
+            }))
+
+        return response
+
+    def _check_budget(self, stats, response):
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, '_query_budget', None)
+        if budget is None or stats['statements'] <= budget:
+            return
+
+        details = {
+            'event': 'query_budget_exceeded',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'budget': budget,
+            'statements': stats['statements'],
+            'top_statements': [
+                {'count': count, 'sql': sql}
+                for sql, count in stats['sql'].most_common(3)
+            ]
+        }
+        if self.budget_mode == 'raise':
+            raise QueryBudgetExceeded(json.dumps(details))
+        budget_logger.warning(json.dumps(details))
+
+    def request_stats(self):
+        """Counters for the current request (None when instrumentation is off)"""
+        return g.get('_instrumentation') if has_app_context() else None
+
+    def metrics_view(self):
+        """Prometheus text exposition of this worker's metrics (bearer METRICS_TOKEN required)"""
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), self.metrics_token.encode()):
+            return Response('Unauthorized\n', status=401, headers={'WWW-Authenticate': 'Bearer'})
+
+        from app.caching import page_cache
+        from app.ingest import ingest_buffer
+        from app.user_cache import user_cache
+
+        lines = [
+            '# TYPE http_request_duration_ms histogram',
+        ]
+        with self._lock:
+            for endpoint, metrics in sorted(self.routes.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), metrics.buckets):
+                    cumulative += count
+                    lines.append(f'http_request_duration_ms_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_ms_sum{{endpoint="{endpoint}"}} {metrics.total_ms:.3f}')
+                lines.append(f'http_request_duration_ms_count{{endpoint="{endpoint}"}} {metrics.count}')
+            lines.append('# TYPE db_statements_total counter')
+            for endpoint, metrics in sorted(self.routes.items()):
+                lines.append(f'db_statements_total{{endpoint="{endpoint}"}} {metrics.statements}')
+            lines.append('# TYPE db_time_ms_total counter')
+            for endpoint, metrics in sorted(self.routes.items()):
+                lines.append(f'db_time_ms_total{{endpoint="{endpoint}"}} {metrics.db_ms:.3f}')
+
+        lines.append('# TYPE user_cache gauge')
+        for name, value in user_cache.stats().items():
+            lines.append(f'user_cache{{stat="{name}"}} {value}')
+        lines.append('# TYPE page_cache gauge')
+        for name, value in page_cache.stats().items():
+            lines.append(f'page_cache{{stat="{name}"}} {value}')
+        lines.append('# TYPE ingest_buffer gauge')
+        for name, value in ingest_buffer.stats().items():
+            lines.append(f'ingest_buffer{{stat="{name}"}} {value}')
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def _start_request():
+    g._instrumentation = {
+        'started': time.perf_counter(),
+        'statements': 0,
+        'db_ms': 0.0,
+        'template_ms': 0.0,
+        'template_started': [],
+        'sql': Counter()
+    }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    stats = g.get('_instrumentation') if has_app_context() else None
+    if stats is None:
+        return
+    stats['statements'] += 1
+    stats['db_ms'] += (time.perf_counter() - started) * 1000
+    stats['sql'][statement[:STATEMENT_PREFIX]] += 1
+
+
+def _cursor_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+def _before_render(sender, template, context, **extra):
+    stats = g.get('_instrumentation')
+    if stats is not None:
+        stats['template_started'].append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    stats = g.get('_instrumentation')
+    if stats is not None and stats['template_started']:
+        stats['template_ms'] += (time.perf_counter() - stats['template_started'].pop()) * 1000
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from app import db
+from app.models import Course, Job, Term
+from app.exports import write_attendance_workbook, write_alerts_workbook, write_risk_workbook
+from app.risk import risk_report
+from app.replicas import replica_router
+
+logger = logging.getLogger('app.jobs')
+
+IN_FLIGHT = ('queued', 'running')
+
+# Shown to the user; the actual exception is logged
+FAILED_MESSAGE = 'The report could not be generated - please try again or contact an administrator'
+INTERRUPTED_MESSAGE = 'The job was interrupted (its server restarted) - please submit it again'
+
+
+class JobLimitReached(Exception):
+    """The user already has JOB_MAX_PER_USER jobs queued or running"""
+
+
+def _courses(params):
+    return Course.query.filter(Course.id.in_(params['course_ids'])).order_by(Course.code).all()
+
+
+def _optional_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def _export(params, path):
+    courses = _courses(params)
+    if params.get('term_id'):
+        # An archived term: its whole date range, from attendance_archive
+        term = db.session.get(Term, params['term_id'])
+        write_attendance_workbook(path, courses, term.start_date, term.end_date, archived=True)
+    else:
+        write_attendance_workbook(path, courses, _optional_date(params.get('start')), _optional_date(params.get('end')))
+    if len(courses) == 1:
+        return f"attendance_{courses[0].code}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+    return f"attendance_{len(courses)}_courses_{datetime.now().strftime('%Y%m%d')}.xlsx"
+
+
+def _alerts(params, path):
+    write_alerts_workbook(path, _courses(params))
+    return f"predictive_alerts_{datetime.now().strftime('%Y%m%d')}.xlsx"
+
+
+def _risk(params, path):
+    write_risk_workbook(path, risk_report(params['course_ids']))
+    return f"at_risk_students_{datetime.now().strftime('%Y%m%d')}.xlsx"
+
+
+# kind -> handler(params, path): writes the result to path, returns the download filename
+JOB_KINDS = {
+    'export': _export,
+    'alerts': _alerts,
+    'risk': _risk,
+}
+
+
+class JobRunner:
+    """Runs exports and reports on a small thread pool inside the web worker
+
+    Status and results live in the jobs table, so any worker can answer a
+    poll; result files go to JOB_RESULTS_DIR. Submitting a job identical to
+    one the same user already has in flight returns that job instead of
+    starting another, and JOB_MAX_PER_USER caps how many each user can
+    queue. JOB_WORKERS bounds how many run at once per process, leaving the
+    request threads for interactive traffic.
+
+    A worker that is recycled or killed takes its queued and running jobs
+    with it. Each worker therefore refreshes heartbeat_at on the jobs it
+    owns every JOB_HEARTBEAT_SECONDS; one whose heartbeat is three beats old
+    counts as lost and is failed by the next refresh() or prune().
+    """
+
+    def __init__(self):
+        self.app = None
+        self.workers = 2
+        self.max_per_user = 3
+        self.timeout = timedelta(minutes=30)
+        self.results_dir = None
+        self.heartbeat = timedelta(seconds=30)
+        self._executor = None
+        self._owned = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.max_per_user = app.config.get('JOB_MAX_PER_USER', self.max_per_user)
+        self.timeout = timedelta(minutes=app.config.get('JOB_TIMEOUT_MINUTES', 30))
+        self.heartbeat = timedelta(seconds=app.config.get('JOB_HEARTBEAT_SECONDS', 30))
+        self.results_dir = app.config['JOB_RESULTS_DIR']
+
+    def _pool(self):
+        # Created on first use so no threads exist before gunicorn forks
+        with self._lock:
+            if self._executor is None:
+                os.makedirs(self.results_dir, exist_ok=True)
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+                threading.Thread(target=self._beat, name='job-heartbeat', daemon=True).start()
+            return self._executor
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat.total_seconds())
+            with self._lock:
+                owned = list(self._owned)
+            if not owned:
+                continue
+            with self.app.app_context():
+                try:
+                    db.session.execute(db.update(Job).where(Job.id.in_(owned)).values(heartbeat_at=datetime.utcnow()))
+                    db.session.commit()
+                except Exception:
+                    logger.exception('Job heartbeat failed')
+                    db.session.rollback()
+
+    def _lost(self, now):
+        """Condition for in-flight jobs that timed out or whose worker stopped beating"""
+        return db.and_(Job.status.in_(IN_FLIGHT), db.or_(
+            Job.created_at < now - self.timeout,
+            db.func.coalesce(Job.heartbeat_at, Job.created_at) < now - 3 * self.heartbeat
+        ))
+
+    def submit(self, kind, params, owner_id):
+        """Queue a job; returns (job, created) - created is False for a deduplicated one"""
+        encoded = json.dumps(params, sort_keys=True, default=str)
+        params_hash = hashlib.sha256(f'{kind}:{encoded}'.encode()).hexdigest()
+        now = datetime.utcnow()
+
+        with self._lock:
+            in_flight = db.select(Job).where(
+                Job.owner_id == owner_id,
+                Job.status.in_(IN_FLIGHT),
+                db.not_(self._lost(now))
+            )
+            existing = db.session.scalar(in_flight.where(
+                Job.kind == kind, Job.params_hash == params_hash
+            ).limit(1))
+            if existing is not None:
+                return existing, False
+
+            count = db.session.scalar(db.select(db.func.count()).select_from(in_flight.subquery()))
+            if count >= self.max_per_user:
+                raise JobLimitReached()
+
+            job = Job(id=uuid.uuid4().hex, kind=kind, params=encoded, params_hash=params_hash,
+                      owner_id=owner_id, status='queued', heartbeat_at=now)
+            db.session.add(job)
+            db.session.commit()
+            self._owned.add(job.id)
+
+        # Decided now, while the submitter's read-your-writes window is known
+        self._pool().submit(self._run, job.id, replica_router.available())
+        return job, True
+
+    def _run(self, job_id, use_replica=False):
+        try:
+            self._execute(job_id, use_replica)
+        finally:
+            with self._lock:
+                self._owned.discard(job_id)
+
+    def _execute(self, job_id, use_replica):
+        with self.app.app_context():
+            job = db.session.get(Job, job_id)
+            job.status = 'running'
+            job.started_at = job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+            # Only the report itself reads from a replica; the job row is on the primary
+            path = os.path.join(self.results_dir, job.id)
+            try:
+                if use_replica:
+                    replica_router.use_replica(db.session)
+                name = JOB_KINDS[job.kind](json.loads(job.params), path)
+            except Exception:
+                logger.exception('Job %s (%s) failed', job_id, job.kind)
+                db.session.rollback()
+                replica_router.use_primary(db.session)
+                if os.path.exists(path):
+                    os.remove(path)
+                job = db.session.get(Job, job_id)
+                job.status = 'failed'
+                job.error = FAILED_MESSAGE
+            else:
+                replica_router.use_primary(db.session)
+                job.status = 'done'
+                job.result_path = path
+                job.result_name = name
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+    def refresh(self, job):
+        """Mark a job failed if it has been unfinished too long or its worker went away"""
+        if job.status not in IN_FLIGHT:
+            return job
+        now = datetime.utcnow()
+        if job.created_at < now - self.timeout:
+            job.error = 'Job did not finish in time'
+        elif (job.heartbeat_at or job.created_at) < now - 3 * self.heartbeat:
+            job.error = INTERRUPTED_MESSAGE
+        else:
+            return job
+        job.status = 'failed'
+        job.finished_at = now
+        db.session.commit()
+        return job
+
+    def prune(self, ttl_hours):
+        """Fail lost jobs and delete finished ones (and their files) older than ttl_hours"""
+        now = datetime.utcnow()
+        lost = db.session.execute(db.update(Job).where(self._lost(now)).values(
+            status='failed', error=INTERRUPTED_MESSAGE, finished_at=now
+        )).rowcount
+
+        expired = db.session.scalars(db.select(Job).where(
+            Job.status.not_in(IN_FLIGHT), Job.finished_at < now - timedelta(hours=ttl_hours)
+        )).all()
+        for job in expired:
+            if job.result_path and os.path.exists(job.result_path):
+                os.remove(job.result_path)
+            db.session.delete(job)
+        db.session.commit()
+        return lost, len(expired)
+
+
+job_runner = JobRunner()
@@ -1,12 +1,22 @@
 from datetime import datetime
 from app import db, login_manager
+from app.user_cache import user_cache, CachedUser
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app.passwords import hash_password, verify_password, needs_rehash
 
-# User loader for Flask-Login
+# User loader for Flask-Login - served from the per-process cache
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(int(user_id), _load_cached_user)
+
+def _load_cached_user(user_id):
+    """Fetch only the columns CachedUser needs"""
+    row = db.session.execute(
+        db.select(User.id, User.username, User.email, User.role, User.roll_no).where(User.id == user_id)
+    ).first()
+    return CachedUser(**row._mapping) if row else None
 
 # User Model (Teachers and Students)
 class User(db.Model, UserMixin):
@@ -19,20 +29,42 @@ class User(db.Model, UserMixin):
     role = db.Column(db.String(20), nullable=False)  # 'teacher' or 'student'
     roll_no = db.Column(db.String(20), unique=True, nullable=True)  # For students
     
-    # Relationships
-    attendance_records = db.relationship('Attendance', backref='student', lazy=True)
+    # Relationships - lazy='raise', so touching one is an error; views select the columns they need
+    attendance_records = db.relationship('Attendance', backref=db.backref('student', lazy='raise'), lazy='raise')
     
     def set_password(self, password):
         """Hash and store password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Verify password"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def upgrade_password_hash(self, password):
+        """Re-hash with the configured parameters if the stored hash is outdated"""
+        if needs_rehash(self.password_hash):
+            self.set_password(password)
+            return True
+        return False
     
     def __repr__(self):
         return f'<User {self.username}>'
 
+# Drop cached users once a change to them (role, password, ...) is committed
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _queue_user_invalidation(mapper, connection, target):
+    object_session(target).info.setdefault('stale_user_ids', set()).add(target.id)
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_cached_users(session):
+    for user_id in session.info.pop('stale_user_ids', ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_user_invalidations(session):
+    session.info.pop('stale_user_ids', None)
+
 # Class/Course Model
 class Course(db.Model):
     __tablename__ = 'courses'
@@ -42,8 +74,8 @@ class Course(db.Model):
     code = db.Column(db.String(20), unique=True, nullable=False)
     teacher_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     
-    # Relationships
-    attendance_records = db.relationship('Attendance', backref='course', lazy=True)
+    # Relationships - lazy='raise' as on User
+    attendance_records = db.relationship('Attendance', backref=db.backref('course', lazy='raise'), lazy='raise')
     
     def __repr__(self):
         return f'<Course {self.code}>'
@@ -57,23 +89,189 @@ class Enrollment(db.Model):
     enrolled_date = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='active')  # active, dropped, completed
     
-    # Relationships
-    student = db.relationship('User', backref='enrollments')
-    course = db.relationship('Course', backref='enrolled_students')
+    # Relationships - lazy='raise' as on User; views join Enrollment explicitly
+    student = db.relationship('User', backref=db.backref('enrollments', lazy='raise'), lazy='raise')
+    course = db.relationship('Course', backref=db.backref('enrolled_students', lazy='raise'), lazy='raise')
+    
+    # A student is enrolled in a course at most once
+    __table_args__ = (
+        db.Index('uq_enrollment_course_student', 'course_id', 'student_id', unique=True),
+        # A student's courses (history pages, dashboards) without scanning every enrollment
+        db.Index('ix_enrollment_student_course', 'student_id', 'course_id'),
+    )
     
     def __repr__(self):
         return f'<Enrollment {self.student_id} in {self.course_id}>'
 
-# Attendance Model
+# Attendance status as stored: a SMALLINT code, mapped to the name in Python
+ATTENDANCE_STATUS_CODES = {'absent': 0, 'present': 1, 'late': 2}
+ATTENDANCE_STATUS_NAMES = {code: name for name, code in ATTENDANCE_STATUS_CODES.items()}
+
+class AttendanceStatus(db.TypeDecorator):
+    """'present'/'absent'/'late' in Python, ATTENDANCE_STATUS_CODES in the database
+    
+    Comparisons such as Attendance.status == 'late' bind the code, so queries
+    keep using the names.
+    """
+    impl = db.SmallInteger
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return ATTENDANCE_STATUS_CODES[value]
+        except KeyError:
+            raise ValueError(f'invalid attendance status {value!r}')
+    
+    def process_result_value(self, value, dialect):
+        return None if value is None else ATTENDANCE_STATUS_NAMES[value]
+
+# Attendance Model - the largest table, so kept to four fixed-width columns
 class Attendance(db.Model):
     __tablename__ = 'attendance'
     
+    # One record per student per class session. The key order (course_id, date,
+    # student_id) serves the course history pages, daily stats and exports
+    # straight from the primary key; it is also the conflict target for upserts
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True, default=datetime.utcnow)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    status = db.Column(AttendanceStatus, nullable=False)
+    
+    __table_args__ = (
+        # Serves the student history pages (keyset on date, course_id, newest first)
+        # and rollup refreshes for a set of students; status is included so both
+        # are answered from the index alone
+        db.Index('ix_attendance_student_date_course_status', 'student_id', 'date', 'course_id', 'status'),
+        # SQLite: store rows in the primary key b-tree instead of beside a rowid
+        {'sqlite_with_rowid': False},
+    )
+    
+    def __repr__(self):
+        return f'<Attendance {self.student_id} - {self.date}>'
+# Attendance of archived terms - same layout as Attendance, moved here by app/terms.py
+class AttendanceArchive(db.Model):
+    __tablename__ = 'attendance_archive'
+    
+    # Read by course and term date range only, so the primary key is the only index
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    status = db.Column(AttendanceStatus, nullable=False)
+    
+    __table_args__ = (
+        {'sqlite_with_rowid': False},
+    )
+    
+    def __repr__(self):
+        return f'<AttendanceArchive {self.student_id} - {self.date}>'
+
+# Academic terms - closed terms can be archived out of the attendance table
+class Term(db.Model):
+    __tablename__ = 'terms'
+    
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
-    status = db.Column(db.String(20), nullable=False)  # 'present', 'absent', 'late'
-    marked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    archived_at = db.Column(db.DateTime)  # Set once its attendance is in attendance_archive
+    archive_started_at = db.Column(db.DateTime)  # From here on its dates are read-only
+    
+    def __repr__(self):
+        return f'<Term {self.name}>'
+
+# Attendance rollup - one row per student per course, maintained on every attendance write
+class AttendanceSummary(db.Model):
+    __tablename__ = 'attendance_summary'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    last_session_date = db.Column(db.Date)  # Most recent marked class
+    
+    __table_args__ = (
+        db.Index('ix_attendance_summary_course', 'course_id'),
+    )
+    
+    def __repr__(self):
+        return f'<AttendanceSummary {self.student_id} in {self.course_id}>'
+
+# Daily attendance per course - one row per class day, maintained on every attendance write
+class CourseDailyStats(db.Model):
+    __tablename__ = 'course_daily_stats'
+    
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CourseDailyStats {self.course_id} on {self.date}>'
+
+# Applied schema migrations - see app/schema.py
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaVersion {self.version}>'
+
+# Freshness version per course - bumped by every attendance or enrollment write
+class CourseVersion(db.Model):
+    __tablename__ = 'course_versions'
+    
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CourseVersion {self.course_id} v{self.version}>'
+
+# Client idempotency keys seen by the batch ingestion API - see app/ingest.py
+class IngestKey(db.Model):
+    __tablename__ = 'ingest_keys'
+    
+    key = db.Column(db.String(100), primary_key=True)
+    student_id = db.Column(db.Integer, nullable=False)
+    course_id = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<IngestKey {self.key}>'
+
+# Background exports and reports - see app/jobs.py
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # JSON
+    params_hash = db.Column(db.String(64), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    result_path = db.Column(db.String(500))
+    result_name = db.Column(db.String(200))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Refreshed by the owning worker while queued or running
+    
+    # Looking for an identical job already in flight
+    __table_args__ = (
+        db.Index('ix_jobs_owner_kind_hash', 'owner_id', 'kind', 'params_hash'),
+    )
     
     def __repr__(self):
-        return f'<Attendance {self.student_id} - {self.date}>'
\ No newline at end of file
+        return f'<Job {self.id} {self.kind} {self.status}>'
\ No newline at end of file
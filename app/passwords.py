@@ -0,0 +1,64 @@
+import threading
+from functools import lru_cache
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt'
+
+
+class HashingBusy(Exception):
+    """Raised when no hashing slot frees up within PASSWORD_HASH_TIMEOUT"""
+
+
+class HashPool:
+    """Caps how many password hashes a worker computes at once
+
+    Hashing is deliberately expensive; during a login burst the semaphore
+    keeps the remaining threads free for dashboard traffic, and callers that
+    wait too long get HashingBusy instead of queueing forever.
+    """
+
+    def __init__(self, size=2, timeout=5):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+
+    def init_app(self, app):
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._slots = threading.BoundedSemaphore(app.config.get('PASSWORD_HASH_CONCURRENCY', 2))
+
+    def run(self, func, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingBusy()
+        try:
+            return func(*args)
+        finally:
+            self._slots.release()
+
+
+hash_pool = HashPool()
+
+
+def configured_method():
+    """Werkzeug hash method from config, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'"""
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+    return DEFAULT_METHOD
+
+
+@lru_cache(maxsize=8)
+def _stored_prefix(method):
+    """The method prefix werkzeug actually writes for a method (fills in default parameters)"""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def hash_password(password):
+    return hash_pool.run(generate_password_hash, password, configured_method())
+
+
+def verify_password(password_hash, password):
+    return hash_pool.run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True when a stored hash was written with different parameters than configured"""
+    return password_hash.split('$', 1)[0] != _stored_prefix(configured_method())
@@ -0,0 +1,93 @@
+import random
+import time
+from functools import wraps
+from flask import current_app, session
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+
+# SQLALCHEMY_BINDS keys that are read replicas (see config.py)
+REPLICA_PREFIX = 'replica_'
+
+# Flask session key: reads stay on the primary until this timestamp
+PRIMARY_UNTIL_KEY = '_primary_until'
+
+
+class RoutingSession(Session):
+    """Session whose reads can go to a read replica
+
+    After ReplicaRouter.use_replica() has put an engine in info['replica'],
+    SELECTs - and session.connection() without a statement - run there.
+    A flush or an INSERT/UPDATE/DELETE always goes to the primary and keeps
+    the rest of the session there, so a view that writes reads its own
+    writes. info['wrote'] records that the session wrote anything.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (self._flushing or getattr(clause, 'is_dml', False)):
+            self.info['wrote'] = True
+            self.info.pop('replica', None)
+
+        replica = self.info.get('replica')
+        if bind is None and replica is not None and (clause is None or getattr(clause, 'is_select', False)):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    """Sends the reads of @read_replica views to a randomly picked replica
+
+    Replicas are the SQLALCHEMY_BINDS entries named replica_*; with none
+    configured everything runs on the primary as before. A user who wrote
+    anything in the last REPLICA_STICKY_SECONDS reads from the primary (a
+    timestamp in their session cookie, so it holds across workers), which
+    keeps the page shown right after marking or enrolling from missing the
+    change because of replication lag.
+    """
+
+    def __init__(self):
+        self.bind_keys = []
+        self.sticky_seconds = 10
+
+    def init_app(self, app):
+        binds = app.config.get('SQLALCHEMY_BINDS') or {}
+        self.bind_keys = sorted(key for key in binds if key.startswith(REPLICA_PREFIX))
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', self.sticky_seconds)
+        if self.bind_keys:
+            app.after_request(self._remember_writes)
+
+    def engines(self):
+        """Replica engines by bind key"""
+        engines = current_app.extensions['sqlalchemy'].engines
+        return {key: engines[key] for key in self.bind_keys}
+
+    def available(self):
+        """Whether this request may read from a replica"""
+        return bool(self.bind_keys) and session.get(PRIMARY_UNTIL_KEY, 0) <= time.time()
+
+    def use_replica(self, db_session):
+        db_session.info['replica'] = random.choice(list(self.engines().values()))
+
+    def use_primary(self, db_session):
+        db_session.info.pop('replica', None)
+
+    def _remember_writes(self, response):
+        if current_user.is_authenticated and current_app.extensions['sqlalchemy'].session.info.get('wrote'):
+            session[PRIMARY_UNTIL_KEY] = time.time() + self.sticky_seconds
+        return response
+
+
+replica_router = ReplicaRouter()
+
+
+def read_replica(view):
+    """Run a read-only view's queries on a replica when one is configured
+
+    Falls back to the primary for users who wrote recently; a write inside
+    the view still goes to the primary.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if replica_router.available():
+            replica_router.use_replica(current_app.extensions['sqlalchemy'].session)
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,404 @@
+import math
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, func
+from app import db
+from app.models import User, Course, Attendance, AttendanceArchive, AttendanceSummary, Enrollment, CourseDailyStats
+
+# Attendance rules shared by every report
+MIN_ATTENDANCE = 0.75  # 75%
+PREDICTION_HORIZON = 3  # "if the student misses the next 3 classes"
+CAUTION_ABSENCES = 2  # absences left before we start warning
+ALERT_ORDER = {'critical': 0, 'warning': 1, 'caution': 2, 'safe': 3}
+
+# Rows fetched per round trip when streaming large result sets
+STREAM_BATCH_SIZE = 2000
+
+# Keyset pagination
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Attendance trends - buckets built from course_daily_stats
+TREND_GRANULARITIES = ('day', 'week', 'term')
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def status_counts(status_column):
+    """Conditional count columns for present/absent/late plus total"""
+    return (
+        func.count().label('total'),
+        func.count(case((status_column == 'present', 1))).label('present'),
+        func.count(case((status_column == 'absent', 1))).label('absent'),
+        func.count(case((status_column == 'late', 1))).label('late')
+    )
+
+
+def course_attendance_counts(course_id, start_date=None, end_date=None, enrolled_only=False, archived=False):
+    """Present/absent/late/total per student for a whole course in one query
+
+    Returns rows with student_id, username, email, roll_no and the counts,
+    ordered by roll number. Students without any attendance are not included;
+    with enrolled_only, neither are students who have since been unenrolled.
+    Whole-term counts come from the rollup; a date range is aggregated from
+    the attendance table, or from attendance_archive when archived.
+    """
+    if archived or start_date or end_date:
+        source = AttendanceArchive if archived else Attendance
+        counts = status_counts(source.status)
+    else:
+        source = AttendanceSummary
+        counts = (
+            AttendanceSummary.total,
+            AttendanceSummary.present,
+            AttendanceSummary.absent,
+            AttendanceSummary.late
+        )
+
+    stmt = db.select(
+        User.id.label('student_id'),
+        User.username,
+        User.email,
+        User.roll_no,
+        *counts
+    ).join(
+        source, source.student_id == User.id
+    ).where(
+        source.course_id == course_id
+    )
+    if enrolled_only:
+        stmt = stmt.join(Enrollment, db.and_(
+            Enrollment.student_id == source.student_id,
+            Enrollment.course_id == source.course_id
+        ))
+    if source is not AttendanceSummary:
+        if start_date:
+            stmt = stmt.where(source.date >= start_date)
+        if end_date:
+            stmt = stmt.where(source.date <= end_date)
+        stmt = stmt.group_by(User.id, User.username, User.email, User.roll_no)
+    stmt = stmt.order_by(User.roll_no, User.username)
+
+    return db.session.execute(stmt).all()
+
+
+def attendance_counts_by_course(course_ids, start_date=None, end_date=None, archived=False):
+    """Counts per (course, student) across several courses and a date range
+
+    Yields plain tuples (course_code, roll_no, username, email, total,
+    present, absent, late) straight off a server-side cursor. Archived
+    terms are read from attendance_archive.
+    """
+    source = AttendanceArchive if archived else Attendance
+    stmt = db.select(
+        Course.code,
+        User.roll_no,
+        User.username,
+        User.email,
+        *status_counts(source.status)
+    ).join(
+        Course, Course.id == source.course_id
+    ).join(
+        User, User.id == source.student_id
+    ).where(
+        source.course_id.in_(course_ids)
+    )
+    if start_date:
+        stmt = stmt.where(source.date >= start_date)
+    if end_date:
+        stmt = stmt.where(source.date <= end_date)
+    stmt = stmt.group_by(
+        Course.code, User.id, User.roll_no, User.username, User.email
+    ).order_by(Course.code, User.roll_no, User.username)
+
+    for row in db.session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE)):
+        yield tuple(row)
+
+
+def student_course_summaries(student_id):
+    """Rollup counts for each course a student is enrolled in, with course name/code"""
+    stmt = db.select(
+        Course.id.label('course_id'),
+        Course.name,
+        Course.code,
+        AttendanceSummary.total,
+        AttendanceSummary.present,
+        AttendanceSummary.absent,
+        AttendanceSummary.late,
+        AttendanceSummary.last_session_date
+    ).join(
+        Enrollment, Enrollment.course_id == AttendanceSummary.course_id
+    ).join(
+        Course, Course.id == AttendanceSummary.course_id
+    ).where(
+        AttendanceSummary.student_id == student_id,
+        Enrollment.student_id == student_id
+    ).order_by(Course.code)
+
+    return db.session.execute(stmt).all()
+
+
+
+def teacher_course_stats(teacher_id, today=None):
+    """One row per course of a teacher with its dashboard numbers, in one query
+
+    Columns: id, name, code, enrolled, sessions (class days marked),
+    last_marked, today_total, today_present. Counts come from pre-grouped
+    subqueries over enrollments and course_daily_stats, so the cost doesn't
+    grow with the number of students.
+    """
+    today = today or date.today()
+    enrolled = db.select(
+        Enrollment.course_id,
+        func.count().label('enrolled')
+    ).group_by(Enrollment.course_id).subquery()
+    sessions = db.select(
+        CourseDailyStats.course_id,
+        func.count().label('sessions'),
+        func.max(CourseDailyStats.date).label('last_marked')
+    ).group_by(CourseDailyStats.course_id).subquery()
+    marked_today = db.select(
+        CourseDailyStats.course_id,
+        CourseDailyStats.total,
+        CourseDailyStats.present
+    ).where(CourseDailyStats.date == today).subquery()
+
+    stmt = db.select(
+        Course.id,
+        Course.name,
+        Course.code,
+        func.coalesce(enrolled.c.enrolled, 0).label('enrolled'),
+        func.coalesce(sessions.c.sessions, 0).label('sessions'),
+        sessions.c.last_marked,
+        func.coalesce(marked_today.c.total, 0).label('today_total'),
+        func.coalesce(marked_today.c.present, 0).label('today_present')
+    ).outerjoin(
+        enrolled, enrolled.c.course_id == Course.id
+    ).outerjoin(
+        sessions, sessions.c.course_id == Course.id
+    ).outerjoin(
+        marked_today, marked_today.c.course_id == Course.id
+    ).where(
+        Course.teacher_id == teacher_id
+    ).order_by(Course.id)
+
+    return db.session.execute(stmt).all()
+
+def percentage(present, total):
+    """Attendance percentage rounded to 2 places (0 when nothing is recorded)"""
+    return round((present / total) * 100, 2) if total > 0 else 0
+
+
+def absences_before_minimum(present, total):
+    """Largest k with present / (total + k) >= MIN_ATTENDANCE (negative once below it)"""
+    return math.floor(present / MIN_ATTENDANCE - total + 1e-9)
+
+
+def predict_alert(present, total):
+    """Current/predicted percentage and alert level for one student"""
+    current_percentage = (present / total) * 100
+
+    # Predict: If student misses next 3 classes
+    predicted_percentage = (present / (total + PREDICTION_HORIZON)) * 100
+
+    # Classes they can still miss and stay at or above the minimum
+    absences_remaining = absences_before_minimum(present, total)
+
+    # Alert conditions
+    threshold = MIN_ATTENDANCE * 100
+    alert_level = 'safe'
+    if current_percentage < threshold:
+        alert_level = 'critical'
+    elif predicted_percentage < threshold:
+        alert_level = 'warning'
+    elif absences_remaining <= CAUTION_ABSENCES:
+        alert_level = 'caution'
+
+    return {
+        'current_percentage': round(current_percentage, 2),
+        'predicted_percentage': round(predicted_percentage, 2),
+        'absences_remaining': absences_remaining,
+        'alert_level': alert_level
+    }
+
+
+
+def course_predictions(course_id):
+    """predict_alert() for every enrolled student with marked classes, most urgent first"""
+    predictions = []
+    for row in course_attendance_counts(course_id, enrolled_only=True):
+        if row.total == 0:
+            continue
+
+        prediction = predict_alert(row.present, row.total)
+        prediction.update({
+            'student': row,
+            'total_classes': row.total,
+            'present': row.present,
+            'absent': row.total - row.present
+        })
+        predictions.append(prediction)
+
+    predictions.sort(key=lambda x: ALERT_ORDER[x['alert_level']])
+    return predictions
+
+def encode_cursor(attendance_date, row_id):
+    """Opaque-enough cursor for the last row of a page (date plus tie-breaking student or course id)"""
+    return f'{attendance_date.isoformat()}_{row_id}'
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; None for a missing or malformed cursor"""
+    try:
+        date_str, row_id = cursor.split('_')
+        return datetime.strptime(date_str, '%Y-%m-%d').date(), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def course_attendance_page(course_id, cursor=None, start_date=None, end_date=None,
+                           status=None, limit=PAGE_SIZE):
+    """One page of a course's attendance history, newest first
+
+    Keyset pagination on (date, student_id) so every page costs the same
+    index range scan no matter how deep it is. Returns (rows, next_cursor);
+    next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    stmt = db.select(
+        Attendance.date,
+        Attendance.student_id,
+        Attendance.status,
+        User.roll_no,
+        User.username
+    ).join(
+        User, User.id == Attendance.student_id
+    ).where(
+        Attendance.course_id == course_id
+    )
+    if start_date:
+        stmt = stmt.where(Attendance.date >= start_date)
+    if end_date:
+        stmt = stmt.where(Attendance.date <= end_date)
+    if status:
+        stmt = stmt.where(Attendance.status == status)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        last_date, last_student_id = position
+        # The redundant date bound is what lets the index seek past earlier pages
+        stmt = stmt.where(Attendance.date <= last_date, db.or_(
+            Attendance.date < last_date,
+            db.and_(Attendance.date == last_date, Attendance.student_id < last_student_id)
+        ))
+
+    stmt = stmt.order_by(Attendance.date.desc(), Attendance.student_id.desc()).limit(limit + 1)
+    rows = db.session.execute(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].student_id)
+    return rows, next_cursor
+
+
+def student_attendance_page(student_id, cursor=None, course_id=None, limit=PAGE_SIZE):
+    """One page of a student's history across enrolled courses, newest first
+
+    Keyset pagination on (date, course_id); returns (rows, next_cursor).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    enrolled = db.select(Enrollment.course_id).where(Enrollment.student_id == student_id)
+    stmt = db.select(
+        Attendance.date,
+        Attendance.course_id,
+        Attendance.status,
+        Course.code,
+        Course.name
+    ).join(
+        Course, Course.id == Attendance.course_id
+    ).where(
+        Attendance.student_id == student_id,
+        Attendance.course_id.in_(enrolled)
+    )
+    if course_id:
+        stmt = stmt.where(Attendance.course_id == course_id)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        last_date, last_course_id = position
+        # The redundant date bound is what lets the index seek past earlier pages
+        stmt = stmt.where(Attendance.date <= last_date, db.or_(
+            Attendance.date < last_date,
+            db.and_(Attendance.date == last_date, Attendance.course_id < last_course_id)
+        ))
+
+    stmt = stmt.order_by(Attendance.date.desc(), Attendance.course_id.desc()).limit(limit + 1)
+    rows = db.session.execute(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].course_id)
+    return rows, next_cursor
+
+
+def course_daily_stats(course_id, start_date=None, end_date=None):
+    """Daily rows for a course in date order - one per class day, never raw attendance"""
+    stmt = db.select(
+        CourseDailyStats.date,
+        CourseDailyStats.total,
+        CourseDailyStats.present,
+        CourseDailyStats.absent,
+        CourseDailyStats.late
+    ).where(CourseDailyStats.course_id == course_id)
+    if start_date:
+        stmt = stmt.where(CourseDailyStats.date >= start_date)
+    if end_date:
+        stmt = stmt.where(CourseDailyStats.date <= end_date)
+    return db.session.execute(stmt.order_by(CourseDailyStats.date)).all()
+
+
+def _bucket(label, sessions, total, present, absent, late):
+    return {
+        'period': label,
+        'sessions': sessions,
+        'total': total,
+        'present': present,
+        'absent': absent,
+        'late': late,
+        'rate': percentage(present, total)
+    }
+
+
+def attendance_trend(days, granularity='day'):
+    """Roll daily rows up into day, week (starting Monday) or whole-term buckets"""
+    buckets = {}
+    for row in days:
+        if granularity == 'week':
+            key = (row.date - timedelta(days=row.date.weekday())).isoformat()
+        elif granularity == 'term':
+            key = 'term'
+        else:
+            key = row.date.isoformat()
+        counts = buckets.setdefault(key, [0, 0, 0, 0, 0])
+        counts[0] += 1
+        counts[1] += row.total
+        counts[2] += row.present
+        counts[3] += row.absent
+        counts[4] += row.late
+
+    if granularity == 'term' and days:
+        return [_bucket(f'{days[0].date.isoformat()} to {days[-1].date.isoformat()}', *buckets['term'])]
+    return [_bucket(label, *counts) for label, counts in buckets.items()]
+
+
+def weekday_pattern(days):
+    """Attendance rate by day of the week the class was held"""
+    counts = [[0, 0, 0, 0, 0] for _ in WEEKDAYS]
+    for row in days:
+        day = counts[row.date.weekday()]
+        day[0] += 1
+        day[1] += row.total
+        day[2] += row.present
+        day[3] += row.absent
+        day[4] += row.late
+    return [_bucket(name, *day) for name, day in zip(WEEKDAYS, counts) if day[0]]
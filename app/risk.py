@@ -0,0 +1,230 @@
+from datetime import date
+from itertools import chain
+import numpy as np
+from app import db
+from app.models import User, Course, Attendance, Enrollment, ATTENDANCE_STATUS_CODES
+from app.reports import MIN_ATTENDANCE, PREDICTION_HORIZON, CAUTION_ABSENCES, ALERT_ORDER
+
+# Most recent sessions of each course compared with the rest of the term
+RECENT_WINDOW = 5
+
+# Rows per round trip while loading the matrix
+LOAD_BATCH_SIZE = 50000
+
+# Cell values in the attendance matrix - the stored status codes, plus UNMARKED
+UNMARKED = -1
+ABSENT, PRESENT, LATE = (ATTENDANCE_STATUS_CODES[name] for name in ('absent', 'present', 'late'))
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+ALERT_LEVELS = sorted(ALERT_ORDER, key=ALERT_ORDER.get)
+
+
+def _day_number(column):
+    """Days since 1970-01-01 computed by the database, so rows arrive as plain ints
+
+    None for dialects without a cheap expression; dates are then converted here.
+    """
+    name = db.engine.dialect.name
+    if name == 'sqlite':
+        return db.cast(db.func.julianday(column) - 2440587.5, db.Integer)
+    if name == 'postgresql':
+        return column - db.cast(db.literal('1970-01-01'), db.Date)
+    return None
+
+
+def load_attendance(course_ids=None):
+    """Every enrolled student's attendance as flat arrays, in one streamed query
+
+    Returns (course_id, student_id, day, code) int64 arrays, day being days
+    since the epoch and code the stored ATTENDANCE_STATUS_CODES value. The
+    database does the date conversion and each batch goes into numpy with
+    one fromiter call - per-row Python work would cost more than everything
+    else in the report.
+    """
+    day = _day_number(Attendance.date)
+    # Raw codes, skipping the name mapping of the AttendanceStatus type
+    code = db.type_coerce(Attendance.status, db.SmallInteger)
+    stmt = db.select(
+        Attendance.course_id,
+        Attendance.student_id,
+        Attendance.date if day is None else day,
+        code
+    ).join(Enrollment, db.and_(
+        Enrollment.course_id == Attendance.course_id,
+        Enrollment.student_id == Attendance.student_id
+    ))
+    if course_ids is not None:
+        stmt = stmt.where(Attendance.course_id.in_(course_ids))
+
+    batches = []
+    result = db.session.connection().execute(stmt.execution_options(yield_per=LOAD_BATCH_SIZE))
+    for rows in result.partitions():
+        if day is None:
+            rows = [(course, student, date.fromisoformat(str(d)).toordinal() - EPOCH_ORDINAL, status)
+                    for course, student, d, status in rows]
+        batches.append(np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=4 * len(rows)))
+
+    if not batches:
+        return tuple(np.empty(0, dtype=np.int64) for _ in range(4))
+    course, student, day, code = np.concatenate(batches).reshape(-1, 4).T
+    return course, student, day, code
+
+
+def build_matrix(course, student, day, code):
+    """Pack flat attendance into a (course, student) x session matrix
+
+    Each row is one enrollment; columns are that course's class days,
+    right-aligned so the last column is every course's most recent session.
+    Days a student has no record for (e.g. before they enrolled) are UNMARKED.
+    Returns (pair_course_ids, pair_student_ids, matrix).
+    """
+    pair_key = (course << 32) | student
+    pairs, pair_index = np.unique(pair_key, return_inverse=True)
+
+    # Distinct class days per course, in date order within each course
+    session_key = (course << 32) | (day - day.min() if len(day) else day)
+    sessions, session_index = np.unique(session_key, return_inverse=True)
+    session_course = sessions >> 32
+    course_ids, first_session, session_counts = np.unique(session_course, return_index=True, return_counts=True)
+
+    width = int(session_counts.max()) if len(session_counts) else 0
+    position = session_index - first_session[np.searchsorted(course_ids, session_course[session_index])]
+    offset = width - session_counts[np.searchsorted(course_ids, course)]
+
+    matrix = np.full((len(pairs), width), UNMARKED, dtype=np.int8)
+    matrix[pair_index, position + offset] = code
+    return pairs >> 32, pairs & 0xFFFFFFFF, matrix
+
+
+def _absence_runs(absent, attended):
+    """Running count of absences since the last attended class, per cell
+
+    Unmarked cells neither extend nor break a run.
+    """
+    count = np.cumsum(absent, axis=1, dtype=np.int32)
+    reset = np.maximum.accumulate(np.where(attended, count, 0), axis=1)
+    return count - reset
+
+
+def assess(matrix, window=RECENT_WINDOW):
+    """Vectorized risk metrics for every row of the matrix (dict of arrays)"""
+    marked = matrix != UNMARKED
+    absent = matrix == ABSENT
+    present_cells = matrix == PRESENT
+    attended = marked & ~absent
+
+    total = marked.sum(axis=1)
+    present = present_cells.sum(axis=1)
+    absences = absent.sum(axis=1)
+    late = (matrix == LATE).sum(axis=1)
+
+    # Same rules as predict_alert(), on whole arrays
+    with np.errstate(divide='ignore', invalid='ignore'):
+        current = np.where(total > 0, present / total * 100, 0.0)
+        predicted = present / (total + PREDICTION_HORIZON) * 100
+        remaining = np.floor(present / MIN_ATTENDANCE - total + 1e-9).astype(np.int64)
+
+        threshold = MIN_ATTENDANCE * 100
+        level = np.select(
+            [current < threshold, predicted < threshold, remaining <= CAUTION_ABSENCES],
+            [ALERT_ORDER['critical'], ALERT_ORDER['warning'], ALERT_ORDER['caution']],
+            ALERT_ORDER['safe']
+        )
+
+        # Trend: attendance over the course's last `window` sessions vs before
+        recent_total = marked[:, -window:].sum(axis=1) if window else np.zeros_like(total)
+        recent_present = present_cells[:, -window:].sum(axis=1) if window else np.zeros_like(total)
+        earlier_total = total - recent_total
+        recent_rate = recent_present / recent_total * 100
+        earlier_rate = (present - recent_present) / earlier_total * 100
+        trend = np.where((recent_total > 0) & (earlier_total > 0), recent_rate - earlier_rate, np.nan)
+
+    runs = _absence_runs(absent, attended)
+    current_streak = runs[:, -1] if runs.shape[1] else np.zeros_like(total)
+    longest_streak = runs.max(axis=1) if runs.shape[1] else np.zeros_like(total)
+
+    return {
+        'total': total,
+        'present': present,
+        'absent': absences,
+        'late': late,
+        'current_percentage': np.round(current, 2),
+        'predicted_percentage': np.round(predicted, 2),
+        'absences_remaining': remaining,
+        'level': level,
+        'trend': np.round(trend, 1),
+        'current_streak': current_streak,
+        'longest_streak': longest_streak
+    }
+
+
+def rank(metrics):
+    """Row order, most at risk first: alert level, then fewest absences left,
+    longest current absence streak, steepest decline and lowest percentage"""
+    trend = np.nan_to_num(metrics['trend'], nan=0.0)
+    return np.lexsort((
+        metrics['current_percentage'],
+        trend,
+        -metrics['current_streak'],
+        metrics['absences_remaining'],
+        metrics['level']
+    ))
+
+
+class RiskReport:
+    """Ranked risk metrics for every enrollment with marked classes"""
+
+    def __init__(self, course_ids, student_ids, metrics):
+        order = rank(metrics)
+        self.course_ids = course_ids[order]
+        self.student_ids = student_ids[order]
+        self.metrics = {name: values[order] for name, values in metrics.items()}
+
+    def __len__(self):
+        return len(self.course_ids)
+
+    def counts(self):
+        """Number of enrollments at each alert level"""
+        counts = np.bincount(self.metrics['level'], minlength=len(ALERT_LEVELS))
+        return {name: int(counts[ALERT_ORDER[name]]) for name in ALERT_LEVELS}
+
+    def rows(self, limit=None, levels=None):
+        """Ranked rows as dicts with student and course details (one lookup each)"""
+        selected = np.arange(len(self))
+        if levels:
+            wanted = [ALERT_ORDER[name] for name in levels if name in ALERT_ORDER]
+            selected = selected[np.isin(self.metrics['level'][selected], wanted)]
+        if limit is not None:
+            selected = selected[:limit]
+        if not len(selected):
+            return []
+
+        student_ids = np.unique(self.student_ids[selected]).tolist()
+        course_ids = np.unique(self.course_ids[selected]).tolist()
+        students = {row.id: row for row in db.session.execute(
+            db.select(User.id, User.username, User.email, User.roll_no).where(User.id.in_(student_ids))
+        )}
+        courses = {row.id: row for row in db.session.execute(
+            db.select(Course.id, Course.code, Course.name).where(Course.id.in_(course_ids))
+        )}
+
+        columns = {name: values[selected].tolist() for name, values in self.metrics.items()}
+        rows = []
+        for i, (course_id, student_id) in enumerate(zip(self.course_ids[selected].tolist(),
+                                                       self.student_ids[selected].tolist())):
+            row = {name: values[i] for name, values in columns.items()}
+            row['alert_level'] = ALERT_LEVELS[row.pop('level')]
+            if row['trend'] != row['trend']:  # NaN - not enough history
+                row['trend'] = None
+            row['student'] = students[student_id]
+            row['course'] = courses[course_id]
+            rows.append(row)
+        return rows
+
+
+def risk_report(course_ids=None):
+    """Build the ranked report for course_ids (every course when None)"""
+    course, student, day, code = load_attendance(course_ids)
+    pair_courses, pair_students, matrix = build_matrix(course, student, day, code)
+    return RiskReport(pair_courses, pair_students, assess(matrix))
@@ -1,23 +1,42 @@
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from flask import send_file
-import io
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+import os
+import unicodedata
+from urllib.parse import quote
+from flask import Blueprint, Response, current_app, render_template, redirect, url_for, flash, request, jsonify, abort, send_file
 from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy.orm import load_only
 from app import db
-from app.models import User, Course, Attendance
-from app.models import User, Course, Attendance, Enrollment  # Add Enrollment
+from app.models import User, Course, Enrollment, Job, Term
+from app.attendance import upsert_attendance, AttendanceReadOnly, VALID_STATUSES
+from app.caching import cached_page, teacher_freshness, student_freshness, course_freshness
+from app.enrollments import sync_enrollments, enroll_all_students
+from app.passwords import HashingBusy
+from app.instrumentation import query_budget
+from app.replicas import read_replica
+from app.exports import export_to_tempfile, stream_file, remove_file, XLSX_MIMETYPE
+from app.jobs import job_runner, JobLimitReached, JOB_KINDS
+from app.risk import risk_report, ALERT_LEVELS
+from app.terms import archived_courses
+from app.reports import course_attendance_counts, course_attendance_page, student_course_summaries, student_attendance_page
+from app.reports import percentage, course_predictions, PAGE_SIZE
+from app.reports import teacher_course_stats, course_daily_stats, attendance_trend, weekday_pattern, TREND_GRANULARITIES
 from datetime import datetime
 
 # Create blueprint
 bp = Blueprint('main', __name__)
 
+def _date_arg(name, values=None):
+    """Parse an optional YYYY-MM-DD query (or form) parameter (None if missing or invalid)"""
+    values = request.args if values is None else values
+    return values.get(name, type=lambda v: datetime.strptime(v, '%Y-%m-%d').date())
+
 @bp.route('/')
+@query_budget(1)
 def index():
     """Home page"""
     return render_template('index.html')
 
 @bp.route('/login', methods=['GET', 'POST'])
+@query_budget(3)
 def login():
     """Login page"""
     if request.method == 'POST':
@@ -26,7 +45,20 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except HashingBusy:
+            flash('Too many sign-ins right now, please try again in a moment', 'warning')
+            return render_template('login.html'), 503
+        
+        if valid:
+            # Transparently move old hashes to the configured parameters
+            try:
+                if user.upgrade_password_hash(password):
+                    db.session.commit()
+            except HashingBusy:
+                pass
+            
             login_user(user)
             flash('Login successful!', 'success')
             
@@ -42,6 +74,7 @@ def login():
 
 @bp.route('/logout')
 @login_required
+@query_budget(1)
 def logout():
     """Logout user"""
     logout_user()
@@ -50,64 +83,95 @@ def logout():
 
 @bp.route('/teacher/dashboard')
 @login_required
+@query_budget(3)
+@read_replica
+@cached_page(teacher_freshness)
 def teacher_dashboard():
     """Teacher dashboard"""
     if current_user.role != 'teacher':
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
-    courses = Course.query.filter_by(teacher_id=current_user.id).all()
+    # Plain values for every course from one grouped query
+    courses = [
+        {
+            'id': row.id,
+            'name': row.name,
+            'code': row.code,
+            'enrolled': row.enrolled,
+            'sessions': row.sessions,
+            'last_marked': row.last_marked,
+            'today_marked': row.today_total > 0,
+            'today_rate': percentage(row.today_present, row.today_total)
+        }
+        for row in teacher_course_stats(current_user.id)
+    ]
     return render_template('teacher_dashboard.html', courses=courses)
 
 @bp.route('/student/dashboard')
 @login_required
+@query_budget(3)
+@read_replica
+@cached_page(student_freshness)
 def student_dashboard():
     """Student dashboard"""
     if current_user.role != 'student':
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
-    # Get only enrolled courses
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
-    enrolled_course_ids = [e.course_id for e in enrollments]
-    
-    # Get attendance records for enrolled courses only
-    records = Attendance.query.filter(
-        Attendance.student_id == current_user.id,
-        Attendance.course_id.in_(enrolled_course_ids) if enrolled_course_ids else False
-    ).all()
-    
-    # Calculate overall attendance percentage
-    total = len(records)
-    present = len([r for r in records if r.status == 'present'])
-    percentage = (present / total * 100) if total > 0 else 0
-    
-    # Group records by course
+    # Per-course counts from the rollup - one row per enrolled course
     course_data = {}
-    for record in records:
-        if record.course_id not in course_data:
-            course_data[record.course_id] = {
-                'course': record.course,
-                'total': 0,
-                'present': 0,
-                'records': []
-            }
-        course_data[record.course_id]['total'] += 1
-        if record.status == 'present':
-            course_data[record.course_id]['present'] += 1
-        course_data[record.course_id]['records'].append(record)
+    total = present = 0
+    for summary in student_course_summaries(current_user.id):
+        course_data[summary.course_id] = {
+            'course': summary,
+            'total': summary.total,
+            'present': summary.present,
+            'percentage': percentage(summary.present, summary.total)
+        }
+        total += summary.total
+        present += summary.present
     
-    # Calculate percentages
-    for course_id in course_data:
-        data = course_data[course_id]
-        data['percentage'] = round((data['present'] / data['total']) * 100, 2) if data['total'] > 0 else 0
+    # Calculate overall attendance percentage
+    overall = percentage(present, total)
     
+    # Detailed history is fetched on demand from student_attendance_history
     return render_template('student_dashboard.html', 
-                         records=records,
-                         percentage=round(percentage, 2),
+                         percentage=overall,
                          course_data=course_data)
+
+@bp.route('/student/attendance-history')
+@login_required
+@query_budget(2)
+@read_replica
+def student_attendance_history():
+    """Paginated attendance history for the logged-in student (JSON)"""
+    if current_user.role != 'student':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    records, next_cursor = student_attendance_page(
+        current_user.id,
+        cursor=request.args.get('after'),
+        course_id=request.args.get('course_id', type=int),
+        limit=request.args.get('per_page', PAGE_SIZE, type=int)
+    )
+    
+    return jsonify({
+        'records': [
+            {
+                'date': record.date.isoformat(),
+                'course_id': record.course_id,
+                'course_code': record.code,
+                'course_name': record.name,
+                'status': record.status
+            }
+            for record in records
+        ],
+        'next_cursor': next_cursor
+    })
 @bp.route('/teacher/mark-attendance/<int:course_id>', methods=['GET', 'POST'])
 @login_required
+@query_budget(8)
 def mark_attendance(course_id):
     """Mark attendance for a course"""
     if current_user.role != 'teacher':
@@ -121,45 +185,45 @@ def mark_attendance(course_id):
         flash('You do not have access to this course', 'danger')
         return redirect(url_for('main.teacher_dashboard'))
     
+    # Only enrolled students can be marked (one query instead of one per enrollment)
+    students = User.query.options(
+        load_only(User.id, User.username, User.email, User.roll_no)
+    ).join(Enrollment, Enrollment.student_id == User.id).filter(
+        Enrollment.course_id == course_id
+    ).order_by(User.roll_no, User.username).all()
+    
+    if not students:
+        flash('No students enrolled in this course. Please enroll students first.', 'warning')
+        return redirect(url_for('main.manage_enrollments', course_id=course_id))
+    
     if request.method == 'POST':
         date_str = request.form.get('date')
         attendance_date = datetime.strptime(date_str, '%Y-%m-%d').date()
         
-    # Get all students
-     # Get only enrolled students
-    enrollments = Enrollment.query.filter_by(course_id=course_id).all()
-    students = [e.student for e in enrollments]
-
-    if not students:
-        flash('No students enrolled in this course. Please enroll students first.', 'warning')
-        return redirect(url_for('main.manage_enrollments', course_id=course_id))
+        rows = []
         for student in students:
             status = request.form.get(f'status_{student.id}')
-            if status:
-                # Check if attendance already exists for this date
-                existing = Attendance.query.filter_by(
-                    student_id=student.id,
-                    course_id=course_id,
-                    date=attendance_date
-                ).first()
-                
-                if existing:
-                    existing.status = status
-                else:
-                    record = Attendance(
-                        student_id=student.id,
-                        course_id=course_id,
-                        date=attendance_date,
-                        status=status
-                    )
-                    db.session.add(record)
+            if status in VALID_STATUSES:
+                rows.append({
+                    'student_id': student.id,
+                    'course_id': course_id,
+                    'date': attendance_date,
+                    'status': status
+                })
         
+        # Whole roster in one statement; safe against concurrent submits
+        try:
+            upsert_attendance(rows)
+        except AttendanceReadOnly:
+            # Archived terms (and one being archived) are read-only
+            db.session.rollback()
+            flash(f'{attendance_date} is in an archived term and can no longer be changed', 'danger')
+            return redirect(url_for('main.mark_attendance', course_id=course_id))
         db.session.commit()
-        flash(f'Attendance marked for {len(students)} students', 'success')
+        flash(f'Attendance marked for {len(rows)} students', 'success')
         return redirect(url_for('main.teacher_dashboard'))
     
     # GET request - show form
-    students = User.query.filter_by(role='student').all()
     today = datetime.now().date()
     
     return render_template('mark_attendance.html', 
@@ -169,6 +233,9 @@ def mark_attendance(course_id):
 
 @bp.route('/teacher/view-attendance/<int:course_id>')
 @login_required
+@query_budget(5)
+@read_replica
+@cached_page(course_freshness)
 def view_course_attendance(course_id):
     """View all attendance records for a course"""
     if current_user.role != 'teacher':
@@ -181,37 +248,100 @@ def view_course_attendance(course_id):
         flash('Access denied', 'danger')
         return redirect(url_for('main.teacher_dashboard'))
     
-    # Get all attendance records for this course
-    records = Attendance.query.filter_by(course_id=course_id).order_by(Attendance.date.desc()).all()
+    # Filters (shared by the summary and the history)
+    start_date = _date_arg('start')
+    end_date = _date_arg('end')
+    status = request.args.get('status')
+    if status not in VALID_STATUSES:
+        status = None
     
-    # Group by student
+    # Per-student counts straight from the database
     student_data = {}
-    for record in records:
-        if record.student_id not in student_data:
-            student_data[record.student_id] = {
-                'student': record.student,
-                'records': [],
-                'total': 0,
-                'present': 0
-            }
-        student_data[record.student_id]['records'].append(record)
-        student_data[record.student_id]['total'] += 1
-        if record.status == 'present':
-            student_data[record.student_id]['present'] += 1
-    
-    # Calculate percentages
-    for student_id in student_data:
-        data = student_data[student_id]
-        if data['total'] > 0:
-            data['percentage'] = round((data['present'] / data['total']) * 100, 2)
-        else:
-            data['percentage'] = 0
+    for row in course_attendance_counts(course_id, start_date, end_date):
+        student_data[row.student_id] = {
+            'student': row,
+            'total': row.total,
+            'present': row.present,
+            'percentage': percentage(row.present, row.total)
+        }
+    
+    # One page of history, newest first
+    records, next_cursor = course_attendance_page(
+        course_id,
+        cursor=request.args.get('after'),
+        start_date=start_date,
+        end_date=end_date,
+        status=status,
+        limit=request.args.get('per_page', PAGE_SIZE, type=int)
+    )
+    
+    filters = {
+        'start': start_date.isoformat() if start_date else '',
+        'end': end_date.isoformat() if end_date else '',
+        'status': status or ''
+    }
     
     return render_template('view_course_attendance.html', 
                          course=course, 
+                         student_data=student_data,
+                         records=records,
+                         next_cursor=next_cursor,
+                         filters=filters,
+                         statuses=VALID_STATUSES)
+@bp.route('/teacher/past-terms')
+@login_required
+@query_budget(2)
+@read_replica
+def past_terms():
+    """Archived terms and the teacher's courses that have attendance in them"""
+    if current_user.role != 'teacher':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    terms = {}
+    for term, course in archived_courses(current_user.id):
+        terms.setdefault(term, []).append(course)
+    
+    return render_template('past_terms.html', terms=terms)
+
+@bp.route('/teacher/past-terms/<int:term_id>/<int:course_id>')
+@login_required
+@query_budget(4)
+@read_replica
+def archived_course_attendance(term_id, course_id):
+    """Read-only attendance summary of a course in an archived term"""
+    if current_user.role != 'teacher':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    term = db.session.get(Term, term_id)
+    if term is None or term.archived_at is None:
+        abort(404)
+    course = Course.query.get_or_404(course_id)
+    
+    if course.teacher_id != current_user.id:
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.teacher_dashboard'))
+    
+    # Aggregated from attendance_archive over the term's dates (primary key range)
+    student_data = []
+    for row in course_attendance_counts(course_id, term.start_date, term.end_date, archived=True):
+        student_data.append({
+            'student': row,
+            'total': row.total,
+            'present': row.present,
+            'absent': row.absent,
+            'late': row.late,
+            'percentage': percentage(row.present, row.total)
+        })
+    
+    return render_template('archived_course_attendance.html',
+                         term=term,
+                         course=course,
                          student_data=student_data)
 @bp.route('/teacher/manage-enrollments/<int:course_id>', methods=['GET', 'POST'])
 @login_required
+@query_budget(6)
 def manage_enrollments(course_id):
     """Manage student enrollments in a course"""
     if current_user.role != 'teacher':
@@ -225,26 +355,22 @@ def manage_enrollments(course_id):
         return redirect(url_for('main.teacher_dashboard'))
     
     if request.method == 'POST':
-        student_ids = request.form.getlist('students')
-        
-        # Remove all existing enrollments
-        Enrollment.query.filter_by(course_id=course_id).delete()
+        student_ids = request.form.getlist('students', type=int)
         
-        # Add new enrollments
-        for student_id in student_ids:
-            enrollment = Enrollment(
-                student_id=int(student_id),
-                course_id=course_id
-            )
-            db.session.add(enrollment)
+        # Apply only the difference between the current and requested roster
+        added, removed = sync_enrollments(course_id, student_ids)
         
         db.session.commit()
-        flash(f'Enrolled {len(student_ids)} students in {course.name}', 'success')
+        flash(f'Enrolled {len(student_ids)} students in {course.name} ({added} added, {removed} removed)', 'success')
         return redirect(url_for('main.teacher_dashboard'))
     
     # GET request - show form
-    all_students = User.query.filter_by(role='student').all()
-    enrolled_student_ids = [e.student_id for e in Enrollment.query.filter_by(course_id=course_id).all()]
+    all_students = User.query.options(
+        load_only(User.id, User.username, User.email, User.roll_no)
+    ).filter_by(role='student').all()
+    enrolled_student_ids = set(db.session.scalars(
+        db.select(Enrollment.student_id).where(Enrollment.course_id == course_id)
+    ))
     
     return render_template('manage_enrollments.html',
                          course=course,
@@ -253,6 +379,7 @@ def manage_enrollments(course_id):
 
 @bp.route('/teacher/bulk-enroll/<int:course_id>', methods=['POST'])
 @login_required
+@query_budget(4)
 def bulk_enroll(course_id):
     """Bulk enroll all students in a course"""
     if current_user.role != 'teacher':
@@ -265,28 +392,36 @@ def bulk_enroll(course_id):
         flash('Access denied', 'danger')
         return redirect(url_for('main.teacher_dashboard'))
     
-    # Enroll all students
-    all_students = User.query.filter_by(role='student').all()
-    
-    for student in all_students:
-        # Check if already enrolled
-        existing = Enrollment.query.filter_by(
-            student_id=student.id,
-            course_id=course_id
-        ).first()
-        
-        if not existing:
-            enrollment = Enrollment(
-                student_id=student.id,
-                course_id=course_id
-            )
-            db.session.add(enrollment)
+    # Enroll all students not already in the course - a single INSERT ... SELECT
+    added = enroll_all_students(course_id)
     
     db.session.commit()
-    flash(f'Enrolled all {len(all_students)} students', 'success')
+    flash(f'Enrolled all students ({added} newly added)', 'success')
     return redirect(url_for('main.manage_enrollments', course_id=course_id))
+def _xlsx_response(courses, filename):
+    """Build the export on disk and stream it back in chunks"""
+    path = export_to_tempfile(courses, _date_arg('start'), _date_arg('end'))
+    response = Response(
+        stream_file(path),
+        mimetype=XLSX_MIMETYPE,
+        headers={'Content-Length': str(os.path.getsize(path))}
+    )
+    # Quoted, with an RFC 6266 UTF-8 name as send_file() does - course codes are user input
+    names = {'filename': filename}
+    if not filename.isascii():
+        names = {
+            'filename': unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii'),
+            'filename*': f"UTF-8''{quote(filename, safe='!#$&+^`|')}"
+        }
+    response.headers.set('Content-Disposition', 'attachment', **names)
+    # Runs even if the body is never read (HEAD, client gone before the first chunk)
+    response.call_on_close(lambda: remove_file(path))
+    return response
+
 @bp.route('/teacher/export-attendance/<int:course_id>')
 @login_required
+@query_budget(4)
+@read_replica
 def export_attendance(course_id):
     """Export attendance to Excel"""
     if current_user.role != 'teacher':
@@ -299,87 +434,131 @@ def export_attendance(course_id):
         flash('Access denied', 'danger')
         return redirect(url_for('main.teacher_dashboard'))
     
-    # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Attendance Report"
-    
-    # Add title
-    ws['A1'] = f"Attendance Report - {course.name}"
-    ws['A1'].font = Font(size=16, bold=True)
-    ws['A2'] = f"Course Code: {course.code}"
-    ws['A3'] = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-    
-    # Headers
-    headers = ['Roll No', 'Student Name', 'Email', 'Total Classes', 'Present', 'Absent', 'Late', 'Attendance %', 'Status']
-    for col, header in enumerate(headers, start=1):
-        cell = ws.cell(row=5, column=col)
-        cell.value = header
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Get attendance data
-    records = Attendance.query.filter_by(course_id=course_id).all()
+    filename = f"attendance_{course.code}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+    return _xlsx_response([course], filename)
+
+@bp.route('/teacher/export-attendance')
+@login_required
+@query_budget(4)
+@read_replica
+def export_attendance_multi():
+    """Export several courses (default: all of the teacher's courses) to one Excel file"""
+    if current_user.role != 'teacher':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    query = Course.query.filter_by(teacher_id=current_user.id)
+    course_ids = request.args.getlist('course_id', type=int)
+    if course_ids:
+        query = query.filter(Course.id.in_(course_ids))
+    courses = query.order_by(Course.code).all()
     
-    student_data = {}
-    for record in records:
-        if record.student_id not in student_data:
-            student_data[record.student_id] = {
-                'student': record.student,
-                'total': 0,
-                'present': 0,
-                'absent': 0,
-                'late': 0
-            }
-        student_data[record.student_id]['total'] += 1
-        student_data[record.student_id][record.status] += 1
-    
-    # Add data
-    row = 6
-    for student_id, data in student_data.items():
-        percentage = round((data['present'] / data['total']) * 100, 2) if data['total'] > 0 else 0
-        status = 'Good' if percentage >= 75 else 'Low'
-        
-        ws.cell(row=row, column=1, value=data['student'].roll_no or 'N/A')
-        ws.cell(row=row, column=2, value=data['student'].username)
-        ws.cell(row=row, column=3, value=data['student'].email)
-        ws.cell(row=row, column=4, value=data['total'])
-        ws.cell(row=row, column=5, value=data['present'])
-        ws.cell(row=row, column=6, value=data['absent'])
-        ws.cell(row=row, column=7, value=data['late'])
-        ws.cell(row=row, column=8, value=f"{percentage}%")
-        ws.cell(row=row, column=9, value=status)
-        
-        # Color code status
-        status_cell = ws.cell(row=row, column=9)
-        if percentage >= 75:
-            status_cell.fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-        else:
-            status_cell.fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-        
-        row += 1
+    if not courses:
+        flash('No courses to export', 'warning')
+        return redirect(url_for('main.teacher_dashboard'))
     
-    # Adjust column widths
-    for col in range(1, 10):
-        ws.column_dimensions[chr(64 + col)].width = 15
+    filename = f"attendance_{len(courses)}_courses_{datetime.now().strftime('%Y%m%d')}.xlsx"
+    return _xlsx_response(courses, filename)
+
+def _job_payload(job):
+    """Status document for pollers"""
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': url_for('main.job_status', job_id=job.id),
+        'download_url': url_for('main.job_download', job_id=job.id) if job.status == 'done' else None
+    }
+
+def _own_job(job_id):
+    """The current teacher's job or 404"""
+    job = db.session.get(Job, job_id)
+    if job is None or job.owner_id != current_user.id:
+        abort(404)
+    return job_runner.refresh(job)
+
+@bp.route('/teacher/jobs/<kind>', methods=['POST'])
+@login_required
+@query_budget(6)
+def submit_job(kind):
+    """Queue an export or report in the background"""
+    if current_user.role != 'teacher':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
     
-    # Save to BytesIO
-    excel_file = io.BytesIO()
-    wb.save(excel_file)
-    excel_file.seek(0)
+    if kind not in JOB_KINDS:
+        abort(404)
+    
+    # Only the teacher's own courses; none selected means all of them
+    query = db.select(Course.id).where(Course.teacher_id == current_user.id)
+    course_ids = request.form.getlist('course_id', type=int)
+    if course_ids:
+        query = query.where(Course.id.in_(course_ids))
+    course_ids = sorted(db.session.scalars(query))
+    
+    # Institution-wide risk report (every course)
+    if kind == 'risk' and request.form.get('scope') == 'all' and _risk_admin():
+        course_ids = None
+    elif not course_ids:
+        flash('No courses selected', 'warning')
+        return redirect(url_for('main.teacher_dashboard'))
     
-    # Send file
-    filename = f"attendance_{course.code}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+    params = {'course_ids': course_ids}
+    term_id = request.form.get('term_id', type=int)
+    if kind == 'export' and term_id:
+        # Export of an archived term
+        term = db.session.get(Term, term_id)
+        if term is None or term.archived_at is None:
+            abort(404)
+        params['term_id'] = term.id
+    elif kind == 'export':
+        start_date, end_date = _date_arg('start', request.form), _date_arg('end', request.form)
+        params.update(start=start_date.isoformat() if start_date else None,
+                      end=end_date.isoformat() if end_date else None)
+    
+    try:
+        job, created = job_runner.submit(kind, params, current_user.id)
+    except JobLimitReached:
+        message = 'You already have several reports running - please wait for one to finish'
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'error': message}), 429
+        flash(message, 'warning')
+        return redirect(url_for('main.teacher_dashboard'))
     
-    return send_file(
-        excel_file,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=filename
-    )
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(_job_payload(job)), 202 if created else 200
+    return redirect(url_for('main.job_status', job_id=job.id))
+
+@bp.route('/teacher/jobs/<job_id>')
+@login_required
+@query_budget(3)
+def job_status(job_id):
+    """Job progress page; JSON for pollers"""
+    job = _own_job(job_id)
+    
+    if request.args.get('format') == 'json' or request.accept_mimetypes.best == 'application/json':
+        return jsonify(_job_payload(job))
+    return render_template('job_status.html', job=job, payload=_job_payload(job))
+
+@bp.route('/teacher/jobs/<job_id>/download')
+@login_required
+@query_budget(3)
+def job_download(job_id):
+    """Download a finished job's result"""
+    job = _own_job(job_id)
+    
+    if job.status != 'done' or not job.result_path or not os.path.exists(job.result_path):
+        abort(404)
+    return send_file(job.result_path, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=job.result_name)
+
 @bp.route('/teacher/predictive-alerts/<int:course_id>')
 @login_required
+@query_budget(4)
+@read_replica
+@cached_page(course_freshness)
 def predictive_alerts(course_id):
     """Show predictive attendance alerts"""
     if current_user.role != 'teacher':
@@ -392,66 +571,99 @@ def predictive_alerts(course_id):
         flash('Access denied', 'danger')
         return redirect(url_for('main.teacher_dashboard'))
     
-    # Get all enrolled students
-    enrollments = Enrollment.query.filter_by(course_id=course_id).all()
-    
-    predictions = []
-    for enrollment in enrollments:
-        student = enrollment.student
-        
-        # Calculate current attendance
-        records = Attendance.query.filter_by(
-            student_id=student.id,
-            course_id=course_id
-        ).all()
-        
-        total = len(records)
-        present = len([r for r in records if r.status == 'present'])
-        
-        if total == 0:
-            continue
-        
-        current_percentage = (present / total) * 100
-        
-        # Predict: If student misses next 3 classes
-        predicted_total = total + 3
-        predicted_present = present
-        predicted_percentage = (predicted_present / predicted_total) * 100
-        
-        # Calculate how many more classes they can miss
-        min_required = 0.75  # 75%
-        max_absences = int((total - (min_required * total)) / (1 - min_required))
-        absences_so_far = total - present
-        absences_remaining = max_absences - absences_so_far
-        
-        # Alert conditions
-        alert_level = 'safe'
-        if current_percentage < 75:
-            alert_level = 'critical'
-        elif predicted_percentage < 75:
-            alert_level = 'warning'
-        elif absences_remaining <= 2:
-            alert_level = 'caution'
-        
-        predictions.append({
-            'student': student,
-            'current_percentage': round(current_percentage, 2),
-            'predicted_percentage': round(predicted_percentage, 2),
-            'absences_remaining': absences_remaining,
-            'alert_level': alert_level,
-            'total_classes': total,
-            'present': present,
-            'absent': total - present
-        })
-    
-    # Sort by alert level
-    alert_order = {'critical': 0, 'warning': 1, 'caution': 2, 'safe': 3}
-    predictions.sort(key=lambda x: alert_order[x['alert_level']])
+    # Counts for every enrolled student, in one grouped query
+    predictions = course_predictions(course_id)
     
     return render_template('predictive_alerts.html',
                          course=course,
                          predictions=predictions)
+@bp.route('/teacher/course-trends/<int:course_id>')
+@login_required
+@query_budget(3)
+@read_replica
+@cached_page(course_freshness)
+def course_trends(course_id):
+    """Attendance over time for a course (charts load their data separately)"""
+    if current_user.role != 'teacher':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    course = Course.query.get_or_404(course_id)
+    
+    if course.teacher_id != current_user.id:
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.teacher_dashboard'))
+    
+    return render_template('course_trends.html', course=course)
+
+@bp.route('/teacher/course-trends/<int:course_id>/data')
+@login_required
+@query_budget(4)
+@read_replica
+@cached_page(course_freshness)
+def course_trends_data(course_id):
+    """Daily/weekly/term attendance rates and the day-of-week pattern as JSON"""
+    if current_user.role != 'teacher':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    course = db.session.get(Course, course_id)
+    if course is None or course.teacher_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in TREND_GRANULARITIES:
+        granularity = 'day'
+    
+    # Only course_daily_stats is read - one row per class day
+    days = course_daily_stats(course_id, _date_arg('start'), _date_arg('end'))
+    
+    return jsonify({
+        'course': {'id': course.id, 'code': course.code, 'name': course.name},
+        'granularity': granularity,
+        'series': attendance_trend(days, granularity),
+        'weekday': weekday_pattern(days)
+    })
+
+def _risk_admin():
+    """Teachers allowed to see every course's students in the risk report"""
+    return current_user.username in current_app.config.get('RISK_REPORT_ADMINS', [])
+
+@bp.route('/teacher/risk-report')
+@login_required
+@query_budget(5)
+@read_replica
+def risk_report_view():
+    """Students most at risk of dropping below 75%, ranked across courses"""
+    if current_user.role != 'teacher':
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    # Every course is too much to rank within a request: institution admins get a background job
+    if request.args.get('scope') == 'all' and _risk_admin():
+        try:
+            job, created = job_runner.submit('risk', {'course_ids': None}, current_user.id)
+        except JobLimitReached:
+            flash('You already have several reports running - please wait for one to finish', 'warning')
+            return redirect(url_for('main.risk_report_view'))
+        return redirect(url_for('main.job_status', job_id=job.id))
+    
+    course_ids = list(db.session.scalars(
+        db.select(Course.id).where(Course.teacher_id == current_user.id)
+    ))
+    
+    level = request.args.get('level')
+    limit = max(1, min(request.args.get('limit', 200, type=int), 1000))
+    report = risk_report(course_ids)
+    
+    return render_template('risk_report.html',
+                         rows=report.rows(limit=limit, levels=[level] if level in ALERT_LEVELS else None),
+                         counts=report.counts(),
+                         total=len(report),
+                         level=level if level in ALERT_LEVELS else '',
+                         can_see_all=_risk_admin())
+
 @bp.route('/pricing')
+@query_budget(1)
 def pricing():
     """Pricing page"""
     return render_template('pricing.html')
@@ -0,0 +1,396 @@
+from sqlalchemy import inspect
+from app import db
+from app.models import SchemaVersion
+
+# Arbitrary key for pg_advisory_lock so concurrent deploys migrate one at a time
+MIGRATION_LOCK_ID = 7241001
+
+
+class MigrationAborted(Exception):
+    """The data can't be migrated as it is; nothing was changed"""
+
+# Migrations declare the tables they create as they were at the time, rather
+# than using the models, so that changing a model never changes what an
+# already-released migration does to an older database.
+
+
+def _metadata():
+    """Fresh MetaData with stubs of the tables foreign keys point at"""
+    metadata = db.MetaData()
+    db.Table('users', metadata, db.Column('id', db.Integer, primary_key=True))
+    db.Table('courses', metadata, db.Column('id', db.Integer, primary_key=True))
+    return metadata
+
+
+def _create(*tables):
+    """Create tables, and any of their indexes that are missing"""
+    for table in tables:
+        table.create(db.engine, checkfirst=True)
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+def _existing_table(name):
+    """The table as it is in the database, which may predate the models"""
+    return db.Table(name, db.MetaData(), autoload_with=db.session.connection())
+
+
+def _drop_duplicates(table, keep, *columns):
+    """Delete rows that would violate a new unique index, keeping one per key"""
+    key = [table.c[column] for column in columns]
+    survivors = db.select(keep(table.c.id)).group_by(*key).scalar_subquery()
+    db.session.execute(db.delete(table).where(table.c.id.not_in(survivors)))
+
+
+def _status_counts(status, present, absent, late):
+    """total/present/absent/late columns for a rollup, given how statuses are stored"""
+    return (
+        db.func.count(),
+        db.func.count(db.case((status == present, 1))),
+        db.func.count(db.case((status == absent, 1))),
+        db.func.count(db.case((status == late, 1)))
+    )
+
+
+def _rebuild_summary(attendance, summary, *statuses):
+    """Refill attendance_summary from attendance"""
+    a = attendance.c
+    db.session.execute(db.delete(summary))
+    db.session.execute(summary.insert().from_select(
+        ['student_id', 'course_id', 'total', 'present', 'absent', 'late', 'last_session_date'],
+        db.select(a.student_id, a.course_id, *_status_counts(a.status, *statuses), db.func.max(a.date))
+        .group_by(a.student_id, a.course_id)
+    ))
+
+
+def _rebuild_daily_stats(attendance, daily_stats, *statuses):
+    """Refill course_daily_stats from attendance"""
+    a = attendance.c
+    db.session.execute(db.delete(daily_stats))
+    db.session.execute(daily_stats.insert().from_select(
+        ['course_id', 'date', 'total', 'present', 'absent', 'late'],
+        db.select(a.course_id, a.date, *_status_counts(a.status, *statuses)).group_by(a.course_id, a.date)
+    ))
+
+
+def _attendance_v1(metadata):
+    """attendance from the unversioned schema to version 5: surrogate id, string statuses"""
+    return db.Table(
+        'attendance', metadata,
+        db.Column('id', db.Integer, primary_key=True),
+        db.Column('student_id', db.Integer, db.ForeignKey('users.id'), nullable=False),
+        db.Column('course_id', db.Integer, db.ForeignKey('courses.id'), nullable=False),
+        db.Column('date', db.Date, nullable=False),
+        db.Column('status', db.String(20), nullable=False),
+        db.Column('marked_at', db.DateTime),
+        db.Index('uq_attendance_course_student_date', 'course_id', 'student_id', 'date', unique=True),
+        db.Index('ix_attendance_course_date_student', 'course_id', 'date', 'student_id'),
+        db.Index('ix_attendance_student_date_course', 'student_id', 'date', 'course_id'),
+    )
+
+
+def _summary_v1(metadata):
+    return db.Table(
+        'attendance_summary', metadata,
+        db.Column('student_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+        db.Column('course_id', db.Integer, db.ForeignKey('courses.id'), primary_key=True),
+        db.Column('total', db.Integer, nullable=False, default=0),
+        db.Column('present', db.Integer, nullable=False, default=0),
+        db.Column('absent', db.Integer, nullable=False, default=0),
+        db.Column('late', db.Integer, nullable=False, default=0),
+        db.Column('last_session_date', db.Date),
+        db.Index('ix_attendance_summary_course', 'course_id'),
+    )
+
+
+def _daily_stats_v5(metadata):
+    return db.Table(
+        'course_daily_stats', metadata,
+        db.Column('course_id', db.Integer, db.ForeignKey('courses.id'), primary_key=True),
+        db.Column('date', db.Date, primary_key=True),
+        db.Column('total', db.Integer, nullable=False, default=0),
+        db.Column('present', db.Integer, nullable=False, default=0),
+        db.Column('absent', db.Integer, nullable=False, default=0),
+        db.Column('late', db.Integer, nullable=False, default=0),
+    )
+
+
+def _baseline():
+    """Tables and indexes added since the unversioned schema"""
+    metadata = _metadata()
+    attendance = _attendance_v1(metadata)
+    enrollments = db.Table(
+        'enrollments', metadata,
+        db.Column('id', db.Integer, primary_key=True),
+        db.Column('student_id', db.Integer, db.ForeignKey('users.id'), nullable=False),
+        db.Column('course_id', db.Integer, db.ForeignKey('courses.id'), nullable=False),
+        db.Column('enrolled_date', db.DateTime),
+        db.Column('status', db.String(20)),
+        db.Index('uq_enrollment_course_student', 'course_id', 'student_id', unique=True),
+    )
+    summary = _summary_v1(metadata)
+
+    # Older databases could hold duplicate rows the new unique indexes forbid
+    _drop_duplicates(attendance, db.func.max, 'course_id', 'student_id', 'date')
+    _drop_duplicates(enrollments, db.func.min, 'course_id', 'student_id')
+    db.session.commit()
+
+    _create(attendance, enrollments, summary)
+
+    _rebuild_summary(attendance, summary, 'present', 'absent', 'late')
+
+
+def _course_versions():
+    """Per-course freshness counters behind ETags and the page cache"""
+    _create(db.Table(
+        'course_versions', _metadata(),
+        db.Column('course_id', db.Integer, db.ForeignKey('courses.id'), primary_key=True),
+        db.Column('version', db.Integer, nullable=False, default=1),
+        db.Column('updated_at', db.DateTime, nullable=False),
+    ))
+
+
+def _ingest_keys():
+    """Idempotency keys for the batch ingestion API"""
+    _create(db.Table(
+        'ingest_keys', _metadata(),
+        db.Column('key', db.String(100), primary_key=True),
+        db.Column('student_id', db.Integer, nullable=False),
+        db.Column('course_id', db.Integer, nullable=False),
+        db.Column('date', db.Date, nullable=False),
+        db.Column('status', db.String(20), nullable=False),
+        db.Column('received_at', db.DateTime, nullable=False),
+        db.Index('ix_ingest_keys_received_at', 'received_at'),
+    ))
+
+
+def _jobs():
+    """Background job status and results"""
+    _create(db.Table(
+        'jobs', _metadata(),
+        db.Column('id', db.String(32), primary_key=True),
+        db.Column('kind', db.String(30), nullable=False),
+        db.Column('params', db.Text, nullable=False),
+        db.Column('params_hash', db.String(64), nullable=False),
+        db.Column('owner_id', db.Integer, db.ForeignKey('users.id'), nullable=False),
+        db.Column('status', db.String(20), nullable=False),
+        db.Column('result_path', db.String(500)),
+        db.Column('result_name', db.String(200)),
+        db.Column('error', db.Text),
+        db.Column('created_at', db.DateTime, nullable=False),
+        db.Column('started_at', db.DateTime),
+        db.Column('finished_at', db.DateTime),
+        db.Index('ix_jobs_owner_kind_hash', 'owner_id', 'kind', 'params_hash'),
+    ))
+
+
+def _daily_stats():
+    """Per-course daily attendance aggregates behind the trend charts"""
+    metadata = _metadata()
+    daily_stats = _daily_stats_v5(metadata)
+    _create(daily_stats)
+    _rebuild_daily_stats(_attendance_v1(metadata), daily_stats, 'present', 'absent', 'late')
+    db.session.commit()
+
+
+# ATTENDANCE_STATUS_CODES as introduced by version 6
+STATUS_CODES_V6 = {'absent': 0, 'present': 1, 'late': 2}
+
+
+def _compact_attendance():
+    """Rebuild attendance with SMALLINT status codes and a (course_id, date, student_id) key
+
+    The old table is renamed aside, its rows copied across with statuses
+    mapped to STATUS_CODES_V6, then dropped. The rollups are rebuilt from
+    the new table. Statuses other than those (case aside) can't be
+    represented, so the migration refuses to start while any are present.
+    """
+    metadata = _metadata()
+    attendance = db.Table(
+        'attendance', metadata,
+        db.Column('course_id', db.Integer, db.ForeignKey('courses.id'), primary_key=True),
+        db.Column('date', db.Date, primary_key=True),
+        db.Column('student_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+        db.Column('status', db.SmallInteger, nullable=False),
+        db.Index('ix_attendance_student_course_date_status', 'student_id', 'course_id', 'date', 'status'),
+        sqlite_with_rowid=False,
+    )
+
+    connection = db.session.connection()
+    current = _existing_table('attendance')
+    unmapped = connection.execute(
+        db.select(current.c.status, db.func.count())
+        .where(db.func.lower(current.c.status).not_in(list(STATUS_CODES_V6)))
+        .group_by(current.c.status)
+    ).all()
+    if unmapped:
+        found = ', '.join(f'{status!r} x {count}' for status, count in unmapped)
+        raise MigrationAborted(f'attendance has statuses version 6 cannot store: {found}; '
+                               f'update or delete those rows and run the migration again')
+
+    for index in inspect(connection).get_indexes('attendance'):
+        connection.execute(db.text(f'DROP INDEX {index["name"]}'))
+    connection.execute(db.text('ALTER TABLE attendance RENAME TO attendance_legacy'))
+    if connection.dialect.name == 'postgresql':
+        # Index names share a namespace with tables; free the name for the new key
+        connection.execute(db.text('ALTER INDEX attendance_pkey RENAME TO attendance_legacy_pkey'))
+    attendance.create(connection)
+
+    legacy = _existing_table('attendance_legacy')
+    status = db.func.lower(legacy.c.status)
+    code = db.case(*[(status == name, value) for name, value in STATUS_CODES_V6.items()])
+    connection.execute(attendance.insert().from_select(
+        ['course_id', 'date', 'student_id', 'status'],
+        db.select(legacy.c.course_id, legacy.c.date, legacy.c.student_id, code)
+    ))
+    connection.execute(db.text('DROP TABLE attendance_legacy'))
+
+    codes = (STATUS_CODES_V6['present'], STATUS_CODES_V6['absent'], STATUS_CODES_V6['late'])
+    _rebuild_summary(attendance, _summary_v1(metadata), *codes)
+    _rebuild_daily_stats(attendance, _daily_stats_v5(metadata), *codes)
+    db.session.commit()
+
+
+def _terms():
+    """Academic terms and the archive their attendance moves to once closed"""
+    metadata = _metadata()
+    _create(
+        db.Table(
+            'terms', metadata,
+            db.Column('id', db.Integer, primary_key=True),
+            db.Column('name', db.String(50), nullable=False, unique=True),
+            db.Column('start_date', db.Date, nullable=False),
+            db.Column('end_date', db.Date, nullable=False),
+            db.Column('archived_at', db.DateTime),
+        ),
+        db.Table(
+            'attendance_archive', metadata,
+            db.Column('course_id', db.Integer, db.ForeignKey('courses.id'), primary_key=True),
+            db.Column('date', db.Date, primary_key=True),
+            db.Column('student_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+            db.Column('status', db.SmallInteger, nullable=False),
+            sqlite_with_rowid=False,
+        )
+    )
+
+
+def _student_history_index():
+    """Order the per-student attendance index like the history pages read it"""
+    attendance = db.Table(
+        'attendance', _metadata(),
+        db.Column('course_id', db.Integer, primary_key=True),
+        db.Column('date', db.Date, primary_key=True),
+        db.Column('student_id', db.Integer, primary_key=True),
+        db.Column('status', db.SmallInteger, nullable=False),
+    )
+    db.Index('ix_attendance_student_course_date_status', attendance.c.student_id, attendance.c.course_id,
+             attendance.c.date, attendance.c.status).drop(db.engine, checkfirst=True)
+    db.Index('ix_attendance_student_date_course_status', attendance.c.student_id, attendance.c.date,
+             attendance.c.course_id, attendance.c.status).create(db.engine, checkfirst=True)
+
+
+def _enrollment_student_index():
+    """Look up a student's enrollments by student_id"""
+    enrollments = db.Table(
+        'enrollments', _metadata(),
+        db.Column('id', db.Integer, primary_key=True),
+        db.Column('student_id', db.Integer, nullable=False),
+        db.Column('course_id', db.Integer, nullable=False),
+    )
+    db.Index('ix_enrollment_student_course', enrollments.c.student_id,
+             enrollments.c.course_id).create(db.engine, checkfirst=True)
+
+
+def _job_heartbeats():
+    """Heartbeat column so jobs of a worker that went away can be failed"""
+    if 'heartbeat_at' in _existing_table('jobs').c:
+        return
+    column_type = db.DateTime().compile(dialect=db.engine.dialect)
+    db.session.execute(db.text(f'ALTER TABLE jobs ADD COLUMN heartbeat_at {column_type}'))
+    db.session.commit()
+
+
+def _term_archive_start():
+    """Record when a term's archival starts, so writes into it stop before rows move"""
+    if 'archive_started_at' in _existing_table('terms').c:
+        return
+    column_type = db.DateTime().compile(dialect=db.engine.dialect)
+    db.session.execute(db.text(f'ALTER TABLE terms ADD COLUMN archive_started_at {column_type}'))
+    db.session.execute(db.text('UPDATE terms SET archive_started_at = archived_at'))
+    db.session.commit()
+
+
+# (version, description, function) - append only, never edit an applied entry
+MIGRATIONS = [
+    (1, 'Baseline: rollup table, unique and history indexes', _baseline),
+    (2, 'Course freshness versions', _course_versions),
+    (3, 'Ingestion idempotency keys', _ingest_keys),
+    (4, 'Background jobs', _jobs),
+    (5, 'Course daily attendance stats', _daily_stats),
+    (6, 'Compact attendance: status codes and composite primary key', _compact_attendance),
+    (7, 'Academic terms and attendance archive', _terms),
+    (8, 'Student history index ordered by date', _student_history_index),
+    (9, 'Enrollments by student', _enrollment_student_index),
+    (10, 'Background job heartbeats', _job_heartbeats),
+    (11, 'Term archival start', _term_archive_start),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version():
+    """Highest applied version, 0 for an unversioned database, None for an empty one"""
+    tables = set(inspect(db.engine).get_table_names())
+    if SchemaVersion.__tablename__ not in tables:
+        return 0 if 'users' in tables else None
+    return db.session.scalar(db.select(db.func.max(SchemaVersion.version))) or 0
+
+
+def _stamp(version, description):
+    db.session.add(SchemaVersion(version=version, description=description))
+    db.session.commit()
+
+
+def bootstrap():
+    """Bring the schema up to date; a single cheap query when it already is
+
+    Run once per deploy before the web workers start (init_db.py). Returns
+    the list of (version, description) applied.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return _migrate()
+
+    # Hold the lock on its own connection; the session's may change between commits
+    with db.engine.connect() as lock_connection:
+        lock_connection.execute(db.text('SELECT pg_advisory_lock(:id)'), {'id': MIGRATION_LOCK_ID})
+        try:
+            return _migrate()
+        finally:
+            lock_connection.execute(db.text('SELECT pg_advisory_unlock(:id)'), {'id': MIGRATION_LOCK_ID})
+
+
+def _migrate():
+    version = current_version()
+
+    # Brand-new database: build the current schema directly
+    if version is None:
+        db.create_all()
+        _stamp(LATEST_VERSION, 'Initial schema')
+        return [(LATEST_VERSION, 'Initial schema')]
+
+    if version == 0:
+        SchemaVersion.__table__.create(db.engine, checkfirst=True)
+
+    applied = []
+    for number, description, migrate in MIGRATIONS:
+        if number > version:
+            migrate()
+            _stamp(number, description)
+            applied.append((number, description))
+    return applied
+
+
+def reset():
+    """Drop everything and recreate the current schema (test data only)"""
+    db.drop_all()
+    bootstrap()
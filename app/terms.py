@@ -0,0 +1,97 @@
+from datetime import date, datetime
+from app import db
+from app.models import Course, Attendance, AttendanceArchive, Term
+from app.attendance import rebuild_summaries, rebuild_daily_stats
+from app.caching import bump_course_versions
+
+ARCHIVE_COLUMNS = ['course_id', 'date', 'student_id', 'status']
+
+
+class TermNotArchivable(Exception):
+    """The term is still open, already archived, or an earlier term isn't archived yet"""
+
+
+def read_only_through():
+    """Last day of the latest term archived or being archived (None before the first)
+
+    Attendance up to and including this date is in attendance_archive, or
+    on its way there, and writers reject it. upsert_attendance() checks it
+    again under the course lock, so a write that raced the start of
+    archival can't leave rows behind in attendance.
+    """
+    return db.session.scalar(
+        db.select(db.func.max(Term.end_date)).where(Term.archive_started_at.is_not(None))
+    )
+
+
+def archived_terms():
+    """Archived terms, most recent first"""
+    return db.session.scalars(
+        db.select(Term).where(Term.archived_at.is_not(None)).order_by(Term.end_date.desc())
+    ).all()
+
+
+def archive_term(term, today=None):
+    """Move a closed term's attendance into attendance_archive
+
+    Terms are archived oldest first so that everything up to
+    read_only_through() is archived once archival completes.
+    archive_started_at is committed first, which makes the term read-only
+    for writers before any row moves. Then one transaction per course: rows are
+    copied with INSERT ... SELECT and deleted, then the course's rollup and
+    daily stats are rebuilt from what is left, which is why dashboards and
+    reports only see current data afterwards. An interrupted run can simply
+    be repeated. Returns the number of rows moved.
+    """
+    today = today or date.today()
+    if term.archived_at is not None:
+        raise TermNotArchivable(f'{term.name} is already archived')
+    if term.end_date >= today:
+        raise TermNotArchivable(f'{term.name} has not ended yet')
+    earlier = db.session.scalar(db.select(Term.name).where(
+        Term.archived_at.is_(None), Term.end_date < term.end_date
+    ).order_by(Term.end_date).limit(1))
+    if earlier:
+        raise TermNotArchivable(f'archive {earlier} first')
+
+    if term.archive_started_at is None:
+        term.archive_started_at = datetime.utcnow()
+        db.session.commit()
+
+    in_term = Attendance.date.between(term.start_date, term.end_date)
+    course_ids = db.session.scalars(db.select(Attendance.course_id).where(in_term).distinct()).all()
+
+    moved = 0
+    for course_id in course_ids:
+        rows = db.select(*[getattr(Attendance, column) for column in ARCHIVE_COLUMNS]).where(
+            Attendance.course_id == course_id, in_term
+        )
+        # Locks the course against concurrent writers, as upsert_attendance() does
+        bump_course_versions([course_id])
+        db.session.execute(db.insert(AttendanceArchive).from_select(ARCHIVE_COLUMNS, rows))
+        moved += db.session.execute(db.delete(Attendance).where(
+            Attendance.course_id == course_id, in_term
+        )).rowcount
+        rebuild_summaries(course_id)
+        rebuild_daily_stats(course_id)
+        db.session.commit()
+
+    term.archived_at = datetime.utcnow()
+    db.session.commit()
+    return moved
+
+
+def archived_courses(teacher_id):
+    """(term, course) rows for every archived term in which a teacher's course has attendance
+
+    One statement; each pair is an EXISTS probe on the archive's primary key.
+    """
+    has_rows = db.select(AttendanceArchive.course_id).where(
+        AttendanceArchive.course_id == Course.id,
+        AttendanceArchive.date.between(Term.start_date, Term.end_date)
+    ).exists()
+    return db.session.execute(
+        db.select(Term, Course).join(Course, Course.teacher_id == teacher_id).where(
+            Term.archived_at.is_not(None), has_rows
+        ).order_by(Term.end_date.desc(), Course.code)
+    ).all()
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from flask_login import UserMixin
+
+
+@dataclass(frozen=True, eq=False)
+class CachedUser(UserMixin):
+    """Read-only snapshot of a User - what current_user is on every request"""
+    id: int
+    username: str
+    email: str
+    role: str
+    roll_no: str = None
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+class UserCache:
+    """Per-process LRU cache of CachedUser objects with a TTL
+
+    Entries are dropped explicitly when this process commits a change to the
+    user (role, password, ...). Other gunicorn workers pick the change up
+    when their entry expires, so USER_CACHE_TTL bounds staleness.
+    """
+
+    def __init__(self, ttl=60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+        self.max_size = app.config.get('USER_CACHE_SIZE', self.max_size)
+
+    def get(self, user_id, loader):
+        """Return the cached user, calling loader(user_id) on a miss or expiry"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        user = loader(user_id)
+        if user is None or self.ttl <= 0:
+            return user
+
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+            }
+
+
+user_cache = UserCache()
@@ -0,0 +1,173 @@
+"""Size and aggregate query time of the attendance table, old layout vs current
+
+    python -m benchmarks.attendance_layout
+    python -m benchmarks.attendance_layout --teachers 40 --students-per-course 300 --weeks 15
+
+Seeds a fresh database (a temporary SQLite file unless BENCH_DATABASE_URL is
+set) with generate_data.generate(), then copies the attendance rows into
+attendance_legacy - the layout before schema version 6: surrogate id,
+VARCHAR status, marked_at and three secondary indexes. Reports table and
+index size for both and the median time of the aggregates the app runs
+against attendance.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+_db_file = None
+if not os.environ.get('BENCH_DATABASE_URL'):
+    _db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL') or f'sqlite:///{_db_file}'
+
+from app import create_app, db  # noqa: E402
+from app.models import Attendance, ATTENDANCE_STATUS_NAMES  # noqa: E402
+from app.reports import status_counts  # noqa: E402
+from app.schema import reset  # noqa: E402
+from generate_data import generate  # noqa: E402
+
+legacy_metadata = db.MetaData()
+
+# attendance as it was before schema version 6
+legacy = db.Table(
+    'attendance_legacy', legacy_metadata,
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('student_id', db.Integer, nullable=False),
+    db.Column('course_id', db.Integer, nullable=False),
+    db.Column('date', db.Date, nullable=False),
+    db.Column('status', db.String(20), nullable=False),
+    db.Column('marked_at', db.DateTime),
+    db.Index('uq_legacy_course_student_date', 'course_id', 'student_id', 'date', unique=True),
+    db.Index('ix_legacy_course_date_student', 'course_id', 'date', 'student_id'),
+    db.Index('ix_legacy_student_date_course', 'student_id', 'date', 'course_id'),
+)
+
+
+def copy_to_legacy():
+    """Same rows as attendance, in the old layout"""
+    legacy.create(db.engine)
+    code = db.type_coerce(Attendance.status, db.SmallInteger)
+    status = db.case(*[(code == value, name) for value, name in ATTENDANCE_STATUS_NAMES.items()])
+    db.session.execute(legacy.insert().from_select(
+        ['student_id', 'course_id', 'date', 'status', 'marked_at'],
+        db.select(Attendance.student_id, Attendance.course_id, Attendance.date, status, db.func.current_timestamp())
+    ))
+    db.session.commit()
+
+
+def sizes(table):
+    """(table bytes, index bytes) as stored on disk"""
+    if db.engine.dialect.name == 'postgresql':
+        return tuple(db.session.execute(db.text(
+            'SELECT pg_table_size(:name), pg_indexes_size(:name)'
+        ), {'name': table.name}).one())
+
+    # SQLite: dbstat lists every b-tree; a WITHOUT ROWID table's rows live in its primary key
+    pages = dict(db.session.execute(db.text('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')).all())
+    indexes = [index.name for index in table.indexes]
+    indexes += [name for name in pages if name.startswith(f'sqlite_autoindex_{table.name}_')]
+    return pages.get(table.name, 0), sum(pages.get(name, 0) for name in indexes)
+
+
+def queries(table, course_id, student_ids, session_date):
+    """name -> statement, built the way app/attendance.py and app/reports.py build them"""
+    c = table.c
+    since = session_date - timedelta(weeks=4)
+    return {
+        'rollup rebuild (all rows)': db.select(
+            c.student_id, c.course_id, *status_counts(c.status), db.func.max(c.date)
+        ).group_by(c.student_id, c.course_id),
+        'course counts, last 4 weeks': db.select(
+            c.student_id, *status_counts(c.status)
+        ).where(c.course_id == course_id, c.date >= since).group_by(c.student_id),
+        'rollup refresh (30 students)': db.select(
+            c.student_id, *status_counts(c.status), db.func.max(c.date)
+        ).where(c.course_id == course_id, c.student_id.in_(student_ids)).group_by(c.student_id),
+        'daily stats for a course': db.select(
+            c.date, *status_counts(c.status)
+        ).where(c.course_id == course_id).group_by(c.date),
+        'absentees on one day': db.select(db.func.count()).where(
+            c.course_id == course_id, c.date == session_date, c.status == 'absent'
+        ),
+    }
+
+
+def time_query(stmt, iterations):
+    """Median milliseconds to run stmt and fetch every row"""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        db.session.execute(stmt).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--teachers', type=int, default=40)
+    parser.add_argument('--courses-per-teacher', type=int, default=5)
+    parser.add_argument('--students-per-course', type=int, default=300)
+    parser.add_argument('--weeks', type=int, default=15)
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app('production')
+
+    try:
+        with app.app_context():
+            reset()
+            print('Seeding...', end=' ', flush=True)
+            counts = generate(
+                teachers=args.teachers,
+                courses_per_teacher=args.courses_per_teacher,
+                students=args.students_per_course * 4,
+                students_per_course=args.students_per_course,
+                weeks=args.weeks,
+                log=lambda *a: None
+            )
+            print(f"{counts['attendance']:,} attendance rows")
+            copy_to_legacy()
+            if db.engine.dialect.name == 'postgresql':
+                db.session.commit()
+                with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                    connection.execute(db.text('VACUUM ANALYZE'))
+            else:
+                db.session.execute(db.text('ANALYZE'))
+                db.session.commit()
+
+            current = Attendance.__table__
+            rows = counts['attendance']
+            print(f"\n{'Layout':<12}{'table MB':>10}{'index MB':>10}{'total MB':>10}{'bytes/row':>11}")
+            print('-' * 53)
+            for name, table in (('legacy', legacy), ('current', current)):
+                table_bytes, index_bytes = sizes(table)
+                print(f"{name:<12}{table_bytes / 2**20:>10.1f}{index_bytes / 2**20:>10.1f}"
+                      f"{(table_bytes + index_bytes) / 2**20:>10.1f}{(table_bytes + index_bytes) / max(rows, 1):>11.1f}")
+
+            course_id, session_date = db.session.execute(
+                db.select(Attendance.course_id, db.func.max(Attendance.date)).group_by(Attendance.course_id).limit(1)
+            ).one()
+            student_ids = db.session.scalars(
+                db.select(Attendance.student_id).where(Attendance.course_id == course_id).distinct().limit(30)
+            ).all()
+
+            print(f"\n{'Query':<32}{'legacy ms':>11}{'current ms':>12}{'change':>9}")
+            print('-' * 64)
+            before = queries(legacy, course_id, student_ids, session_date)
+            after = queries(current, course_id, student_ids, session_date)
+            for name in before:
+                old = time_query(before[name], args.iterations)
+                new = time_query(after[name], args.iterations)
+                print(f"{name:<32}{old:>11.2f}{new:>12.2f}{(new - old) / old:>+9.0%}")
+
+            db.session.rollback()
+            legacy.drop(db.engine)
+    finally:
+        if _db_file:
+            os.remove(_db_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Login throughput per worker for different password hashing settings
+
+    python -m benchmarks.password_hashing
+    python -m benchmarks.password_hashing --method pbkdf2:sha256:600000 --threads 4
+
+Each setting is reported as logins/sec on one thread and on --threads
+threads sharing a bounded pool of --concurrency slots, which is what one
+gunicorn worker with PASSWORD_HASH_CONCURRENCY sees.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from app.passwords import HashPool
+
+DEFAULT_METHODS = [
+    'scrypt:32768:8:1',
+    'scrypt:16384:8:1',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:100000',
+]
+
+
+def logins_per_second(password_hash, rounds, threads, concurrency):
+    pool = HashPool(size=concurrency, timeout=None)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(
+            lambda _: pool.run(check_password_hash, password_hash, 'password123'),
+            range(rounds)
+        ))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    return rounds / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--method', action='append', help='werkzeug hash method (repeatable)')
+    parser.add_argument('--rounds', type=int, default=20, help='logins per measurement')
+    parser.add_argument('--threads', type=int, default=4, help='request threads per worker')
+    parser.add_argument('--concurrency', type=int, default=2, help='PASSWORD_HASH_CONCURRENCY')
+    args = parser.parse_args()
+
+    print(f"{'Method':<26}{'ms/login':>10}{'1 thread':>12}{f'{args.threads} threads':>12}")
+    print('-' * 60)
+    for method in args.method or DEFAULT_METHODS:
+        password_hash = generate_password_hash('password123', method=method)
+        single = logins_per_second(password_hash, args.rounds, 1, 1)
+        pooled = logins_per_second(password_hash, args.rounds, args.threads, args.concurrency)
+        print(f"{method:<26}{1000 / single:>10.1f}{single:>12.1f}{pooled:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""Latency, SQL statement count and peak memory for every route in app/routes.py
+
+    python -m benchmarks.routes
+    python -m benchmarks.routes --students-per-course 300 --weeks 15 --iterations 50
+    python -m benchmarks.routes --save-baseline benchmarks/baseline.json
+    python -m benchmarks.routes --baseline benchmarks/baseline.json --tolerance 0.25
+
+Seeds a fresh database (a temporary SQLite file unless BENCH_DATABASE_URL is
+set) with generate_data.generate(), logs in as a generated teacher and
+student through the Flask test client and drives each route. With
+--baseline the run exits non-zero when a route's p95 latency grows by more
+than --tolerance or it issues more SQL statements than recorded. Views run
+with QUERY_BUDGET_MODE=raise, so a page exceeding its @query_budget fails
+the run.
+
+The page cache and the user cache are off by default so every request does
+its full work - that is what the budgets are declared against. Measure the
+warm path in a separate run and keep its baseline apart:
+
+    PAGE_CACHE_ENABLED=1 USER_CACHE_TTL=60 python -m benchmarks.routes --save-baseline benchmarks/baseline-warm.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+_db_file = None
+if not os.environ.get('BENCH_DATABASE_URL'):
+    _db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL') or f'sqlite:///{_db_file}'
+os.environ.setdefault('QUERY_BUDGET_MODE', 'raise')
+os.environ.setdefault('PAGE_CACHE_ENABLED', '0')
+os.environ.setdefault('USER_CACHE_TTL', '0')
+
+from sqlalchemy import event  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User, Course, Enrollment, Attendance, Job, Term  # noqa: E402
+from app.schema import reset  # noqa: E402
+from app.terms import archive_term  # noqa: E402
+from generate_data import generate, DEFAULT_PASSWORD  # noqa: E402
+
+
+class StatementCounter:
+    """Counts SQL statements sent through an engine by the creating thread
+
+    Background jobs run on their own threads and are not counted against
+    the request that queued them.
+    """
+
+    def __init__(self, engine):
+        self.count = 0
+        self.thread_id = threading.get_ident()
+        event.listen(engine, 'before_cursor_execute', self._before)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.thread_id:
+            self.count += 1
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def login(app, username):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': DEFAULT_PASSWORD})
+    assert response.status_code == 302, f'login failed for {username}'
+    return client
+
+
+def archive_first_week():
+    """Archive the first week of generated attendance as a past term"""
+    start = db.session.scalar(db.select(db.func.min(Attendance.date)))
+    term = Term(name='Benchmark term', start_date=start, end_date=start + timedelta(days=6))
+    db.session.add(term)
+    db.session.commit()
+    archive_term(term)
+    return term
+
+
+def finished_job(app, client, kind, form, timeout=60):
+    """Submit a job through the route and wait for it to finish; returns its id"""
+    # Own app context: requests would otherwise share g (and the logged-in user) with the caller's
+    with app.app_context():
+        response = client.post(f'/teacher/jobs/{kind}', data=form, headers={'Accept': 'application/json'})
+    assert response.status_code in (200, 202), f'{kind} job -> {response.status_code}'
+    job_id = response.get_json()['id']
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        db.session.expire_all()
+        job = db.session.get(Job, job_id)
+        if job.status == 'done':
+            return job_id
+        assert job.status != 'failed', f'{kind} job failed: {job.error}'
+        time.sleep(0.05)
+    raise AssertionError(f'{kind} job did not finish in {timeout}s')
+
+
+def build_scenarios(app):
+    """(name, client, method, url, form) for every route with a @query_budget"""
+    course = Course.query.join(Enrollment, Enrollment.course_id == Course.id).first()
+    teacher = db.session.get(User, course.teacher_id)
+    student_id = db.session.scalar(db.select(Enrollment.student_id).where(Enrollment.course_id == course.id))
+    student = db.session.get(User, student_id)
+    roster = db.session.scalars(db.select(Enrollment.student_id).where(Enrollment.course_id == course.id)).all()
+    term = archive_first_week()
+
+    anonymous_client = app.test_client()
+    teacher_client = login(app, teacher.username)
+    student_client = login(app, student.username)
+    mark_form = {'date': date.today().isoformat()}
+    mark_form.update({f'status_{sid}': 'present' for sid in roster})
+    login_form = {'username': teacher.username, 'password': DEFAULT_PASSWORD}
+    job_id = finished_job(app, teacher_client, 'export', {'course_id': course.id})
+
+    return [
+        ('index', anonymous_client, 'GET', '/', None),
+        ('pricing', anonymous_client, 'GET', '/pricing', None),
+        ('login GET', anonymous_client, 'GET', '/login', None),
+        ('login POST', app.test_client(), 'POST', '/login', login_form),
+        ('teacher_dashboard', teacher_client, 'GET', '/teacher/dashboard', None),
+        ('student_dashboard', student_client, 'GET', '/student/dashboard', None),
+        ('student_attendance_history', student_client, 'GET', '/student/attendance-history', None),
+        ('mark_attendance GET', teacher_client, 'GET', f'/teacher/mark-attendance/{course.id}', None),
+        ('mark_attendance POST', teacher_client, 'POST', f'/teacher/mark-attendance/{course.id}', mark_form),
+        ('view_course_attendance', teacher_client, 'GET', f'/teacher/view-attendance/{course.id}', None),
+        ('export_attendance', teacher_client, 'GET', f'/teacher/export-attendance/{course.id}', None),
+        ('predictive_alerts', teacher_client, 'GET', f'/teacher/predictive-alerts/{course.id}', None),
+        ('manage_enrollments', teacher_client, 'GET', f'/teacher/manage-enrollments/{course.id}', None),
+        ('manage_enrollments POST', teacher_client, 'POST', f'/teacher/manage-enrollments/{course.id}',
+         {'students': roster}),
+        ('bulk_enroll', teacher_client, 'POST', f'/teacher/bulk-enroll/{course.id}', None),
+        ('export_attendance_multi', teacher_client, 'GET', '/teacher/export-attendance', None),
+        ('course_trends', teacher_client, 'GET', f'/teacher/course-trends/{course.id}', None),
+        ('course_trends_data', teacher_client, 'GET', f'/teacher/course-trends/{course.id}/data?granularity=week', None),
+        ('risk_report_view', teacher_client, 'GET', '/teacher/risk-report', None),
+        ('past_terms', teacher_client, 'GET', '/teacher/past-terms', None),
+        ('archived_course_attendance', teacher_client, 'GET', f'/teacher/past-terms/{term.id}/{course.id}', None),
+        ('submit_job', teacher_client, 'POST', '/teacher/jobs/alerts', {'course_id': course.id}),
+        ('job_status', teacher_client, 'GET', f'/teacher/jobs/{job_id}', None),
+        ('job_download', teacher_client, 'GET', f'/teacher/jobs/{job_id}/download', None),
+    ]
+
+
+def run_scenario(client, method, url, form, counter, iterations):
+    def request():
+        response = client.open(url, method=method, data=form)
+        response.get_data()  # drain streamed bodies
+        assert response.status_code in (200, 302, 304), f'{method} {url} -> {response.status_code}'
+
+    request()  # warm-up (template compile, statement cache)
+
+    before = counter.count
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        request()
+        timings.append((time.perf_counter() - started) * 1000)
+    statements = (counter.count - before) / iterations
+
+    # Memory in a separate pass - tracemalloc slows everything down
+    tracemalloc.start()
+    request()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'statements': round(statements, 2),
+        'peak_kb': round(peak / 1024, 1)
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions as human readable strings"""
+    failures = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        if result['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+            failures.append(f"{name}: p95 {result['p95_ms']}ms > baseline {expected['p95_ms']}ms")
+        if result['statements'] > expected['statements']:
+            failures.append(f"{name}: {result['statements']} statements > baseline {expected['statements']}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--teachers', type=int, default=5)
+    parser.add_argument('--courses-per-teacher', type=int, default=3)
+    parser.add_argument('--students-per-course', type=int, default=100)
+    parser.add_argument('--weeks', type=int, default=15)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--only', action='append', help='run only these routes (repeatable)')
+    parser.add_argument('--baseline', help='fail when results regress against this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 growth vs baseline')
+    parser.add_argument('--save-baseline', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    app = create_app('production')
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+
+    try:
+        with app.app_context():
+            reset()
+            print('Seeding...', end=' ', flush=True)
+            counts = generate(
+                teachers=args.teachers,
+                courses_per_teacher=args.courses_per_teacher,
+                students_per_course=args.students_per_course,
+                weeks=args.weeks,
+                log=lambda *a: None
+            )
+            print(', '.join(f'{count:,} {table}' for table, count in counts.items()))
+            warm = app.config['PAGE_CACHE_ENABLED'] or app.config['USER_CACHE_TTL']
+            print(f"Caches {'on (warm run)' if warm else 'off (cold run)'}")
+            counter = StatementCounter(db.engine)
+            scenarios = build_scenarios(app)
+
+        results = {}
+        print(f"\n{'Route':<30}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'SQL/req':>9}{'peak KB':>10}")
+        print('-' * 76)
+        for name, client, method, url, form in scenarios:
+            if args.only and name not in args.only:
+                continue
+            result = run_scenario(client, method, url, form, counter, args.iterations)
+            results[name] = result
+            print(f"{name:<30}{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+                  f"{result['statements']:>9}{result['peak_kb']:>10}")
+    finally:
+        if _db_file:
+            os.remove(_db_file)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'\nBaseline written to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.tolerance)
+        if failures:
+            print('\n❌ Regressions:')
+            for failure in failures:
+                print(f'  {failure}')
+            sys.exit(1)
+        print('\n✅ No regressions against baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,24 @@
 import os
+import tempfile
+
+# Gunicorn worker model - read here too so the DB pool is sized to match (see gunicorn.conf.py)
+WORKERS = int(os.environ.get('WEB_CONCURRENCY', 2))
+WORKER_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Each worker process has its own pool: a connection for every request thread
+# plus a little overflow for background jobs
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', WORKER_THREADS))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', max(2, WORKER_THREADS // 2)))
+
+# Most connections the app can hold open on the primary (and on each replica)
+# at once; has to fit in the server's max_connections next to other clients
+DB_CONNECTION_BUDGET = WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+
+def _database_url(url):
+    """Fix for Render PostgreSQL URLs (postgres:// is no longer accepted)"""
+    if url and url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
 
 class Config:
     """Base configuration"""
@@ -7,26 +27,98 @@ class Config:
     basedir = os.path.abspath(os.path.dirname(__file__))
     
     # Use PostgreSQL in production, SQLite in development
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
+    SQLALCHEMY_DATABASE_URI = _database_url(os.environ.get('DATABASE_URL')) or \
         'sqlite:///' + os.path.join(basedir, 'attendance.db')
     
-    # Fix for Render PostgreSQL URL
-    if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith("postgres://"):
-        SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace("postgres://", "postgresql://", 1)
+    # Read replicas (comma separated URLs) for views marked @read_replica - see app/replicas.py
+    SQLALCHEMY_BINDS = {
+        f'replica_{n}': _database_url(url.strip())
+        for n, url in enumerate(u for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip())
+    }
+    # After a user writes, their reads stay on the primary this long (replication lag)
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Run schema migrations inside create_app (off for multi-worker deployments)
+    SCHEMA_BOOTSTRAP_ON_START = False
+    
+    # Per-process cache for the Flask-Login user loader
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # seconds, 0 disables
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    
+    # Password hashing - werkzeug method string; older hashes are upgraded on login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', 2))  # per worker
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))  # seconds to wait for a slot
+    
+    # Per-request SQL/template timing: Server-Timing headers, slow-request log, /metrics
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '0') == '1'
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', '1') == '1'
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # scrapers send 'Authorization: Bearer <token>'; no token, no /metrics
+    
+    # Per-view SQL statement budgets (@query_budget): 'off', 'warn' (log) or 'raise' (fail the request)
+    QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'off')
+    
+    # Conditional GET + rendered-page cache for dashboards and course reports
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', '1') == '1'
+    PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024))  # per worker
+    RELEASE = os.environ.get('RENDER_GIT_COMMIT', '')  # new deploy -> new ETags
+    
+    # Batch ingestion API for kiosks and card scanners (/api/attendance/batch)
+    INGEST_API_TOKENS = [t for t in os.environ.get('INGEST_API_TOKENS', '').split(',') if t]
+    INGEST_MAX_ITEMS = int(os.environ.get('INGEST_MAX_ITEMS', 1000))  # per request
+    INGEST_FLUSH_SIZE = int(os.environ.get('INGEST_FLUSH_SIZE', 500))  # buffered rows that force a flush
+    INGEST_FLUSH_MS = int(os.environ.get('INGEST_FLUSH_MS', 200))  # longest a row waits to be batched
+    INGEST_KEY_RETENTION_DAYS = int(os.environ.get('INGEST_KEY_RETENTION_DAYS', 14))
+    
+    # Background jobs (exports, reports) run on a thread pool inside each worker
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # concurrent jobs per worker process
+    JOB_MAX_PER_USER = int(os.environ.get('JOB_MAX_PER_USER', 3))  # queued + running
+    JOB_TIMEOUT_MINUTES = int(os.environ.get('JOB_TIMEOUT_MINUTES', 30))  # older unfinished jobs count as lost
+    JOB_HEARTBEAT_SECONDS = int(os.environ.get('JOB_HEARTBEAT_SECONDS', 30))  # 3 missed beats: the worker is gone
+    JOB_RESULT_TTL_HOURS = int(os.environ.get('JOB_RESULT_TTL_HOURS', 24))
+    JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR') or os.path.join(tempfile.gettempdir(), 'attendance-jobs')
+    
+    # Teachers (by username) allowed to see the at-risk report across every course
+    RISK_REPORT_ADMINS = [u for u in os.environ.get('RISK_REPORT_ADMINS', 'admin').split(',') if u]
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
+    
+    # Single process locally, so migrating on startup is safe and convenient
+    SCHEMA_BOOTSTRAP_ON_START = True
+    
+    # Surface N+1 regressions while developing
+    QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'warn')
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
+    
+    # One pool per worker process (see DB_CONNECTION_BUDGET), stale connections weeded out
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
 
 # Choose config based on environment
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
-}
\ No newline at end of file
+}
+
+def config_name_from_env():
+    """FLASK_CONFIG if set, otherwise production on Render or when DATABASE_URL is set"""
+    if os.environ.get('FLASK_CONFIG'):
+        return os.environ['FLASK_CONFIG']
+    if os.environ.get('RENDER') or os.environ.get('DATABASE_URL'):
+        return 'production'
+    return 'default'
\ No newline at end of file
@@ -1,13 +1,14 @@
 from app import create_app, db
 from app.models import User, Course, Attendance, Enrollment
+from app.attendance import rebuild_summaries, rebuild_daily_stats
+from app.schema import reset
 from datetime import datetime, timedelta
 
 app = create_app()
 
 with app.app_context():
     # Clear existing data
-    db.drop_all()
-    db.create_all()
+    reset()
     
     print("=" * 60)
     print("Creating test data with enrollments...")
@@ -131,6 +132,12 @@ with app.app_context():
     db.session.commit()
     print("✅ Created attendance records")
     
+    # Records above bypass upsert_attendance, so build the rollup in one go
+    rebuild_summaries()
+    rebuild_daily_stats()
+    db.session.commit()
+    print("✅ Built attendance rollup")
+    
     print("\n" + "=" * 60)
     print("✅ TEST DATA CREATED SUCCESSFULLY!")
     print("=" * 60)
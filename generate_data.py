@@ -0,0 +1,214 @@
+"""Generate a synthetic dataset of any size for load testing
+
+    python generate_data.py --reset --students-per-course 300 --weeks 15
+    python generate_data.py --institutions 3 --teachers 20 --courses-per-teacher 4 \
+        --students 5000 --students-per-course 250 --weeks 15 --sessions-per-week 3
+
+Everything goes through Core executemany in large batches with one
+pre-computed password hash, so millions of attendance rows take seconds to
+tens of seconds. Attendance patterns come from --profiles: comma separated
+weight:presence pairs, e.g. "0.6:0.95,0.3:0.8,0.1:0.55" means 60% of
+students attend ~95% of classes, 30% ~80% and 10% ~55%.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from app import create_app, db
+from app.models import User, Course, Enrollment, Attendance
+from app.attendance import rebuild_summaries, rebuild_daily_stats
+from app.passwords import hash_password
+from app.schema import bootstrap, reset
+from config import config_name_from_env
+
+# Rows per executemany call
+INSERT_BATCH_SIZE = 50000
+
+DEFAULT_PASSWORD = 'password123'
+
+
+def parse_profiles(spec):
+    """'0.6:0.95,0.4:0.7' -> ([0.6, 0.4], [0.95, 0.7])"""
+    weights, rates = [], []
+    for part in spec.split(','):
+        weight, rate = part.split(':')
+        weights.append(float(weight))
+        rates.append(float(rate))
+    return weights, rates
+
+
+def _insert(table, rows):
+    """executemany in batches; rows may be any iterable of dicts"""
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        count += len(batch)
+    return count
+
+
+def _ids_by(column, id_column, prefix):
+    return dict(db.session.execute(db.select(column, id_column).where(column.startswith(prefix))).all())
+
+
+def session_dates(start, weeks, sessions_per_week, offset):
+    """Class days for one course: sessions_per_week weekdays, staggered by course"""
+    weekdays = sorted({(offset + i * 2) % 5 for i in range(sessions_per_week)})
+    monday = start - timedelta(days=start.weekday())
+    return [
+        monday + timedelta(weeks=week, days=weekday)
+        for week in range(weeks)
+        for weekday in weekdays
+        if monday + timedelta(weeks=week, days=weekday) >= start
+    ]
+
+
+def generate(institutions=1, teachers=5, courses_per_teacher=3, students=None,
+             students_per_course=50, weeks=15, sessions_per_week=3, profiles='0.6:0.95,0.3:0.8,0.1:0.55',
+             late_rate=0.05, start=None, seed=42, log=print):
+    """Create users, courses, enrollments and attendance; returns row counts"""
+    rng = random.Random(seed)
+    weights, rates = parse_profiles(profiles)
+    students = students or students_per_course * 2
+    start = start or date.today() - timedelta(weeks=weeks)
+    today = date.today()
+    password_hash = hash_password(DEFAULT_PASSWORD)
+    counts = {'users': 0, 'courses': 0, 'enrollments': 0, 'attendance': 0}
+
+    for inst in range(1, institutions + 1):
+        prefix = f'i{inst}-'
+
+        # Users - one shared password hash
+        counts['users'] += _insert(User.__table__, (
+            {
+                'username': f'{prefix}teacher{n}',
+                'email': f'{prefix}teacher{n}@school.test',
+                'password_hash': password_hash,
+                'role': 'teacher',
+                'roll_no': None
+            }
+            for n in range(1, teachers + 1)
+        ))
+        counts['users'] += _insert(User.__table__, (
+            {
+                'username': f'{prefix}student{n}',
+                'email': f'{prefix}student{n}@school.test',
+                'password_hash': password_hash,
+                'role': 'student',
+                'roll_no': f'{prefix.upper()}{n:06d}'
+            }
+            for n in range(1, students + 1)
+        ))
+        teacher_ids = list(_ids_by(User.username, User.id, f'{prefix}teacher').values())
+        student_ids = list(_ids_by(User.username, User.id, f'{prefix}student').values())
+
+        # Courses
+        counts['courses'] += _insert(Course.__table__, (
+            {
+                'name': f'Course {t}-{c}',
+                'code': f'{prefix.upper()}C{t:03d}{c:02d}',
+                'teacher_id': teacher_id
+            }
+            for t, teacher_id in enumerate(teacher_ids, start=1)
+            for c in range(1, courses_per_teacher + 1)
+        ))
+        course_ids = list(_ids_by(Course.code, Course.id, prefix.upper()).values())
+
+        # Enrollments and attendance, one course at a time
+        for offset, course_id in enumerate(course_ids):
+            roster = rng.sample(student_ids, min(students_per_course, len(student_ids)))
+            counts['enrollments'] += _insert(Enrollment.__table__, (
+                {'student_id': student_id, 'course_id': course_id, 'status': 'active'}
+                for student_id in roster
+            ))
+
+            presence = dict(zip(roster, rng.choices(rates, weights, k=len(roster))))
+            dates = [d for d in session_dates(start, weeks, sessions_per_week, offset) if d <= today]
+
+            def attendance_rows():
+                for session_date in dates:
+                    for student_id in roster:
+                        roll = rng.random()
+                        if roll >= presence[student_id]:
+                            status = 'absent'
+                        elif roll < late_rate:
+                            status = 'late'
+                        else:
+                            status = 'present'
+                        yield {
+                            'student_id': student_id,
+                            'course_id': course_id,
+                            'date': session_date,
+                            'status': status
+                        }
+
+            counts['attendance'] += _insert(Attendance.__table__, attendance_rows())
+            db.session.commit()
+
+        log(f"  institution {inst}: {len(teacher_ids)} teachers, {len(student_ids)} students, "
+            f"{len(course_ids)} courses")
+
+    # Derived tables in one pass each
+    rebuild_summaries()
+    rebuild_daily_stats()
+    db.session.commit()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--institutions', type=int, default=1)
+    parser.add_argument('--teachers', type=int, default=5, help='teachers per institution')
+    parser.add_argument('--courses-per-teacher', type=int, default=3)
+    parser.add_argument('--students', type=int, default=None,
+                        help='students per institution (default: 2 x students-per-course)')
+    parser.add_argument('--students-per-course', type=int, default=50)
+    parser.add_argument('--weeks', type=int, default=15, help='term length in weeks')
+    parser.add_argument('--sessions-per-week', type=int, default=3)
+    parser.add_argument('--profiles', default='0.6:0.95,0.3:0.8,0.1:0.55',
+                        help='weight:presence pairs for attendance patterns')
+    parser.add_argument('--late-rate', type=float, default=0.05, help='share of attended classes marked late')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='drop all data first')
+    args = parser.parse_args()
+
+    app = create_app(config_name_from_env())
+    with app.app_context():
+        if args.reset:
+            reset()
+        else:
+            bootstrap()
+
+        print("=" * 60)
+        print("Generating synthetic data...")
+        print("=" * 60)
+        started = time.perf_counter()
+        counts = generate(
+            institutions=args.institutions,
+            teachers=args.teachers,
+            courses_per_teacher=args.courses_per_teacher,
+            students=args.students,
+            students_per_course=args.students_per_course,
+            weeks=args.weeks,
+            sessions_per_week=args.sessions_per_week,
+            profiles=args.profiles,
+            late_rate=args.late_rate,
+            seed=args.seed
+        )
+        elapsed = time.perf_counter() - started
+
+        print("-" * 60)
+        for table, count in counts.items():
+            print(f"  {table:<12} {count:>12,}")
+        print(f"✅ Done in {elapsed:.1f}s - all passwords: {DEFAULT_PASSWORD}")
+        print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
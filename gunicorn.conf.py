@@ -0,0 +1,42 @@
+"""Gunicorn settings - everything can be overridden from the environment
+
+    WEB_CONCURRENCY        worker processes (default: 2)
+    GUNICORN_THREADS       threads per worker (default: 4; also sizes the DB pool)
+    GUNICORN_WORKER_CLASS  default: gthread when threads > 1, else sync
+    PORT                   listen port (default: 5000)
+    DB_MAX_CONNECTIONS     connections the database allows this app (optional)
+
+Every worker opens up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections (by
+default the thread count plus half of it), so the app can hold
+workers x (pool_size + max_overflow) at once: 2 x (4 + 2) = 12 with the
+defaults. Raise WEB_CONCURRENCY only as far as the database allows; with
+DB_MAX_CONNECTIONS set, gunicorn refuses to start when the pools could
+exceed it.
+"""
+import os
+from config import WORKERS, WORKER_THREADS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_CONNECTION_BUDGET
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+workers = WORKERS
+threads = WORKER_THREADS
+
+max_connections = int(os.environ.get('DB_MAX_CONNECTIONS', 0))
+if max_connections and DB_CONNECTION_BUDGET > max_connections:
+    raise SystemExit(
+        f'{workers} workers x (pool_size {DB_POOL_SIZE} + max_overflow {DB_MAX_OVERFLOW}) = '
+        f'{DB_CONNECTION_BUDGET} connections, more than DB_MAX_CONNECTIONS={max_connections}'
+    )
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+
+# Slow exports and reports shouldn't get workers killed; keep-alive for the browser
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
@@ -1,11 +1,11 @@
 from app import create_app, db
 from app.models import User, Course
-import os
+from app.schema import bootstrap, LATEST_VERSION
+from config import config_name_from_env
 import sys
 
 # Detect if running on Render
-is_production = os.environ.get('RENDER') or os.environ.get('DATABASE_URL')
-config_name = 'production' if is_production else 'default'
+config_name = config_name_from_env()
 
 print("=" * 60)
 print(f"INITIALIZING DATABASE (Environment: {config_name})")
@@ -15,13 +15,13 @@ app = create_app(config_name)
 
 with app.app_context():
     try:
-        # ALWAYS drop and recreate tables in production on startup
-        print("Dropping all tables...")
-        db.drop_all()
-        
-        print("Creating all tables...")
-        db.create_all()
-        print("✅ Database tables created!")
+        # Apply pending migrations once, before gunicorn forks its workers
+        print("Checking schema version...")
+        applied = bootstrap()
+        for version, description in applied:
+            print(f"✅ Schema v{version}: {description}")
+        if not applied:
+            print(f"ℹ️  Schema is current (v{LATEST_VERSION})")
         
         # Check if admin exists
         admin = User.query.filter_by(username='admin').first()
@@ -67,4 +67,5 @@ with app.app_context():
         import traceback
         traceback.print_exc()
         sys.stdout.flush()
-        # Don't exit with error - let app start anyway
+        # Fail the deploy rather than start workers on a half-migrated schema
+        sys.exit(1)
@@ -1,7 +1,8 @@
 from app import create_app
+from config import config_name_from_env
 
-# Create the application
-app = create_app('development')
+# Create the application (production on Render / when DATABASE_URL is set)
+app = create_app(config_name_from_env())
 
 if __name__ == '__main__':
     # Run the development server
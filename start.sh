@@ -1,5 +1,4 @@
+#!/bin/sh
 echo "START SCRIPT EXECUTED"
-python3 init_db.py
-exec gunicorn run:app#!/bin/sh
-python3 init_db.py
-exec gunicorn run:app
+python3 init_db.py || exit 1
+exec gunicorn -c gunicorn.conf.py run:app